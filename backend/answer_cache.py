@@ -0,0 +1,131 @@
+import os
+import re
+import threading
+import time
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+# Configuration
+ANSWER_CACHE_ENABLED = os.environ.get('ANSWER_CACHE_ENABLED', 'false').lower() == 'true'
+ANSWER_CACHE_TTL = int(os.environ.get('ANSWER_CACHE_TTL', 600))  # seconds
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get('ANSWER_CACHE_MAX_ENTRIES', 1000))
+ANSWER_CACHE_SIMILARITY = float(os.environ.get('ANSWER_CACHE_SIMILARITY', 0))  # 0 disables near-duplicate matching
+
+
+def normalize_question(question):
+    question = re.sub(r'\s+', ' ', question.strip().lower())
+    return question.rstrip('?!. ')
+
+
+def hash_context(chunks):
+    """Hash the retrieved chunks independent of their ranking order"""
+    digest = hashlib.sha256()
+    for chunk in sorted(chunks):
+        digest.update(chunk.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class AnswerCache:
+    """TTL and size bounded cache of generated answers.
+
+    Answers are keyed by user, corpus version, a hash of the retrieved chunks and
+    the normalized question. With a similarity threshold set, a question that misses
+    exactly may still match an earlier one over the same context whose query
+    embedding is at least that similar. The embedding is the one retrieval already
+    computed for the question, passed in as query_vector.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl=ANSWER_CACHE_TTL,
+                 similarity_threshold=ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()  # {key: (expires_at, answer, query_vector)}
+        self._buckets = {}  # Keys sharing user, version and context: {bucket: set(key)}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def near_duplicates(self):
+        return self.similarity_threshold > 0
+
+    def lookup(self, user_id, question, chunks, corpus_version, query_vector=None):
+        """Return the cached answer, or None on a miss"""
+        bucket = (user_id, corpus_version, hash_context(chunks))
+        key = bucket + (normalize_question(question),)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._remove(key)
+            candidates = list(self._buckets.get(bucket, ()))
+
+        if self.near_duplicates and candidates and query_vector is not None:
+            query_vector = self._normalize(query_vector)
+            with self._lock:
+                best_key, best_score = None, self.similarity_threshold
+                for candidate in candidates:
+                    entry = self._entries.get(candidate)
+                    if entry is None or entry[0] <= now or entry[2] is None:
+                        continue
+                    score = float(np.dot(query_vector, entry[2]))
+                    if score >= best_score:
+                        best_key, best_score = candidate, score
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self.near_hits += 1
+                    return self._entries[best_key][1]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def store(self, user_id, question, chunks, corpus_version, answer, query_vector=None):
+        bucket = (user_id, corpus_version, hash_context(chunks))
+        key = bucket + (normalize_question(question),)
+        query_vector = self._normalize(query_vector) if self.near_duplicates and query_vector is not None else None
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.time() + self.ttl, answer, query_vector)
+            self._buckets.setdefault(bucket, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'near_hits': self.near_hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def _normalize(self, query_vector):
+        vector = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, key):
+        if self._entries.pop(key, None) is None:
+            return
+        bucket = key[:3]
+        keys = self._buckets.get(bucket)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._buckets[bucket]
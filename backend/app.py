@@ -1,7 +1,15 @@
-from flask import Flask, request, jsonify, session
+import time
+_import_start = time.perf_counter()
+
+from flask import Flask, request, jsonify, session, Response, stream_with_context, g
 import os
+import threading
+import importlib
 import tempfile
 import uuid
+import base64
+import hashlib
+import atexit
 import pickle
 from datetime import datetime, timedelta
 import json
@@ -10,31 +18,50 @@ from flask_cors import CORS
 from flask_bcrypt import Bcrypt
 import jwt
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 import os.path
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-
-from langchain_community.document_loaders import PDFPlumberLoader
-from langchain_experimental.text_splitter import SemanticChunker
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_community.llms import Ollama
-from langchain_core.prompts import PromptTemplate
-from langchain.chains.llm import LLMChain
 
 from models import db, User, File, ChatHistory
+from embeddings import get_embedder, configure_embedding_cache
+from retriever_cache import RetrieverCache
+from retrieval import RETRIEVAL_MAX_K, RETRIEVAL_MAX_FETCH_K, UnknownSources
+from ingestion import IngestionQueue, IngestionQueueFull
+from pdf_parsing import PdfParser
+from blob_store import BlobStore
+from uploads import UploadSessions, UploadError, UploadOffsetMismatch, PdfSniffer, UPLOAD_AUTO_PROCESS
+from answer_cache import AnswerCache, ANSWER_CACHE_ENABLED
+from context_builder import HistoryWindow, pack_context, dedupe_chunks, format_history, estimate_tokens
+from history_writer import HistoryWriter, HISTORY_WRITE_BEHIND
+from llm_scheduler import LLMScheduler, LLMSchedulerBusy
+from passwords import PasswordHasher, PasswordHasherBusy, PASSWORD_HASH_RETRY_AFTER
+from startup import Startup, in_child_process
+from metrics import registry, timed, begin_timings, end_timings, current_timings, REQUEST_LATENCY, IN_FLIGHT, ERRORS, PROMPT_TOKENS, INGESTED_PAGES, INGESTION_SECONDS
+
+# Heavy libraries (LangChain, FAISS, the embedding model) are imported on first use or by the warmup thread
+startup = Startup()
+startup.record('imports', (time.perf_counter() - _import_start) * 1000)
+_setup_start = time.perf_counter()
 
 app = Flask(__name__)
 CORS(app, supports_credentials=True)  # Enable CORS with credential support
 bcrypt = Bcrypt(app)
+password_hasher = PasswordHasher(bcrypt)
 
 # Configuration
-UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', tempfile.mkdtemp())
+# Set in the environment so spawned PDF workers, which re-import this module, share the folder
+UPLOAD_FOLDER = os.environ.setdefault('UPLOAD_FOLDER', tempfile.mkdtemp())
 VECTOR_STORE_FOLDER = os.environ.get('VECTOR_STORE_FOLDER', os.path.join(UPLOAD_FOLDER, 'vector_stores'))
+PAGE_CACHE_FOLDER = os.environ.get('PAGE_CACHE_FOLDER', os.path.join(UPLOAD_FOLDER, 'page_cache'))
+BLOB_FOLDER = os.environ.get('BLOB_FOLDER', os.path.join(UPLOAD_FOLDER, 'blobs'))
+EMBEDDING_CACHE_PATH = os.environ.get('EMBEDDING_CACHE_PATH', os.path.join(UPLOAD_FOLDER, 'embedding_cache.sqlite3'))
 ALLOWED_EXTENSIONS = {'pdf'}
 MAX_FILES = 10
 JWT_SECRET = os.environ.get('JWT_SECRET', 'pou-78392gec9gi&**Y(1bvyi183)#UI@yujkbnn::s')
 JWT_EXPIRATION = 24  # hours
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+CHAT_BATCH_MAX_QUESTIONS = int(os.environ.get('CHAT_BATCH_MAX_QUESTIONS', 32))
+CHAT_BATCH_CONCURRENCY = int(os.environ.get('CHAT_BATCH_CONCURRENCY', 4))  # LLM calls in flight per batch
 GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID', 'your-google-client-id.apps.googleusercontent.com')
 
 # Database configuration
@@ -51,31 +78,49 @@ os.makedirs(VECTOR_STORE_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 32 * 1024 * 1024  # 32MB max file size
 
-# In-memory storage for retrievers and conversation history
-user_retrievers = {}  # Store user retrievers: {user_id: retriever}
-user_conversations = {}  # Store conversation history: {user_id: [{"human": "...", "ai": "..."}]}
+def get_user_index_path(user_id):
+    return os.path.join(VECTOR_STORE_FOLDER, user_id)
 
-# Load vector stores on startup
-def load_vector_stores():
-    try:
-        for user_dir in os.listdir(VECTOR_STORE_FOLDER):
-            user_path = os.path.join(VECTOR_STORE_FOLDER, user_dir)
-            if os.path.isdir(user_path):
-                try:
-                    # Load the vector store if it exists
-                    embedder = HuggingFaceEmbeddings()
-                    vector_store = FAISS.load_local(user_path, embedder)
-                    user_retrievers[user_dir] = vector_store.as_retriever(
-                        search_type="similarity", search_kwargs={"k": 4}
-                    )
-                    print(f"Loaded vector store for user {user_dir}")
-                except Exception as e:
-                    print(f"Error loading vector store for user {user_dir}: {str(e)}")
-    except Exception as e:
-        print(f"Error loading vector stores: {str(e)}")
+def load_user_index(user_id):
+    """Load a user's index and manifest from disk"""
+    from vector_index import UserIndex
+    return UserIndex.load(get_user_index_path(user_id), get_embedder())
 
-# Load vector stores on startup
-load_vector_stores()
+def lock_user_index(user_id):
+    """Update lock of a user's index, held across load and save by every worker"""
+    from vector_index import UserIndex
+    return UserIndex.lock(get_user_index_path(user_id))
+
+def load_user_search_index(user_id):
+    """Open the memory-mapped snapshot used to answer a user's questions"""
+    from vector_index import UserIndex
+    return UserIndex.load(get_user_index_path(user_id), get_embedder(), for_search=True)
+
+def user_index_exists(user_id):
+    from vector_index import UserIndex
+    return UserIndex.exists(get_user_index_path(user_id))
+
+def user_index_version(user_id):
+    from vector_index import UserIndex
+    return UserIndex.disk_version(get_user_index_path(user_id))
+
+# Uploads are stored once per distinct content; chunk embeddings are cached across users
+blob_store = BlobStore(BLOB_FOLDER)
+# Resumable uploads are assembled next to the blobs, so completing one is a rename
+upload_sessions = UploadSessions(os.path.join(BLOB_FOLDER, 'uploads'))
+configure_embedding_cache(EMBEDDING_CACHE_PATH)
+
+# PDF page extraction runs on a process pool with a page cache keyed by file hash
+pdf_parser = PdfParser(PAGE_CACHE_FOLDER)
+
+# Retrievers are loaded lazily from VECTOR_STORE_FOLDER and kept in an LRU cache
+user_retrievers = RetrieverCache(load_user_search_index, user_index_exists, version_fn=user_index_version)
+# Optional cache of generated answers, invalidated by the corpus version
+answer_cache = AnswerCache() if ANSWER_CACHE_ENABLED else None
+history_writer = HistoryWriter(app) if HISTORY_WRITE_BEHIND else None
+if history_writer is not None:
+    atexit.register(history_writer.close)
+user_conversations = {}  # Store conversation history: {user_id: [{"human": "...", "ai": "..."}]}
 
 # Authentication helper functions
 def generate_token(user_id, email):
@@ -101,7 +146,8 @@ def token_required(f):
         
         try:
             # Decode token
-            data = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+            with timed('jwt_decode'):
+                data = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
             current_user = data['user_id']
         except jwt.ExpiredSignatureError:
             return jsonify({'success': False, 'message': 'Token has expired'}), 401
@@ -116,143 +162,468 @@ def token_required(f):
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def process_user_files(user_id):
-    """Process all files for a user and create/update retriever"""
+def process_user_files(user_id, progress=None, remove=None):
+    """Index new files and drop deleted ones from the user's retriever.
+
+    With remove, only those file ids are dropped and nothing is processed. Works
+    on a fresh copy of the index loaded from disk; the retriever used by chat is
+    only swapped once the updated index has been saved. Jobs for the same user in
+    other workers wait for the index lock.
+    """
+    with lock_user_index(user_id):
+        if remove is not None:
+            return _remove_user_files(user_id, remove)
+        return _process_user_files(user_id, progress)
+
+def _remove_user_files(user_id, file_ids):
+    try:
+        index = load_user_index(user_id)
+    except Exception as e:
+        return {"success": False, "message": f"Error loading index: {str(e)}"}
+
+    removed = [file_id for file_id in file_ids if index.remove_file(file_id)]
+    if not removed:
+        return {"success": True, "message": "No indexed files to remove"}
+
+    with timed('index_save'):
+        index.save()
+    user_retrievers.put(user_id, index)
+    return {"success": True, "message": f"Removed {len(removed)} deleted file(s) from index"}
+
+def _process_user_files(user_id, progress=None):
+    progress = progress or (lambda **kwargs: None)
     user_files = File.query.filter_by(user_id=user_id).all()
+
+    try:
+        index = load_user_index(user_id)
+    except Exception as e:
+        return {"success": False, "message": f"Error loading index: {str(e)}"}
+
+    # Drop files that were removed since the last run
+    current_ids = {file_info.id for file_info in user_files}
+    removed = [file_id for file_id in index.file_ids if file_id not in current_ids]
+    for file_id in removed:
+        index.remove_file(file_id)
+
     if not user_files:
+        if removed:
+            index.save()
+            user_retrievers.put(user_id, index)
+            return {"success": True, "message": "Removed deleted files from index"}
         return {"success": False, "message": "No files uploaded"}
-    
-    # Load all documents
-    all_documents = []
-    for file_info in user_files:
-        try:
-            # Check if file exists
-            if not os.path.exists(file_info.path):
-                continue
-                
-            loader = PDFPlumberLoader(file_info.path)
-            docs = loader.load()
-            # Add source information
-            for doc in docs:
-                doc.metadata['source'] = file_info.name
-            all_documents.extend(docs)
-        except Exception as e:
-            return {"success": False, "message": f"Error loading {file_info.name}: {str(e)}"}
-    
-    if not all_documents:
+
+    # Only new files need to be loaded and embedded
+    new_files = [file_info for file_info in user_files
+                 if file_info.id not in index.file_ids and os.path.exists(file_info.path)]
+    progress(files_total=len(new_files))
+
+    # Load new documents in parallel; a file that fails to load is skipped
+    loaded = []
+    failed_files = []
+    with timed('pdf_parse'):
+        parsed = pdf_parser.parse_files([(file_info.path, file_info.name, file_info.blob_sha256) for file_info in new_files])
+    for file_info, (docs, error) in zip(new_files, parsed):
+        if error is not None:
+            failed_files.append({'name': file_info.name, 'message': f"Error loading {file_info.name}: {str(error)}"})
+        else:
+            loaded.append((file_info, docs))
+    progress(pages_total=sum(len(docs) for _, docs in loaded), failed_files=failed_files)
+
+    if not loaded and index.is_empty:
+        if failed_files:
+            return {"success": False, "message": failed_files[0]['message'], "failed_files": failed_files}
         return {"success": False, "message": "No documents could be loaded"}
 
     try:
-        # Create embeddings
-        embedder = HuggingFaceEmbeddings()
-        
-        # Split documents
-        text_splitter = SemanticChunker(embedder)
-        documents = text_splitter.split_documents(all_documents)
-
-        # Create vector store
-        vector_store = FAISS.from_documents(documents, embedder)
-        user_retrievers[user_id] = vector_store.as_retriever(
-            search_type="similarity", 
-            search_kwargs={"k": 4}
-        )
-        
-        # Save vector store to disk
-        user_vector_dir = os.path.join(VECTOR_STORE_FOLDER, user_id)
-        os.makedirs(user_vector_dir, exist_ok=True)
-        vector_store.save_local(user_vector_dir)
-        
+        from chunking import Chunker
+
+        # Shared embedding service; only the chunks the index embeds go through the cache
+        chunker = Chunker(get_embedder(cached=False))
+        progress(chunking_mode=chunker.mode)
+
+        # Split and embed each new file into the existing index
+        pages_done = 0
+        chunks = 0
+        ingest_seconds = 0.0
+        for files_done, (file_info, docs) in enumerate(loaded, 1):
+            start_time = time.perf_counter()
+            with timed('chunking'):
+                documents, vectors = chunker.split(docs)
+            with timed('embedding'):
+                index.add_file(file_info.id, file_info.name, documents, vectors)
+            elapsed = time.perf_counter() - start_time
+            INGESTED_PAGES.inc(len(docs), mode=chunker.mode)
+            INGESTION_SECONDS.inc(elapsed, mode=chunker.mode)
+            ingest_seconds += elapsed
+            pages_done += len(docs)
+            chunks += len(documents)
+            progress(files_done=files_done, pages_done=pages_done, chunks=chunks,
+                     pages_per_second=round(pages_done / ingest_seconds, 2) if ingest_seconds else None)
+
+        # Save vector store to disk, then swap in the new retriever
+        if loaded or removed:
+            with timed('index_save'):
+                index.save()
+        user_retrievers.put(user_id, index)
+
+        if failed_files:
+            return {
+                "success": True,
+                "message": f"Processed {len(loaded)} of {len(new_files)} new files; {len(failed_files)} could not be loaded",
+                "failed_files": failed_files
+            }
         return {"success": True, "message": "Files processed successfully"}
     except Exception as e:
         return {"success": False, "message": f"Error processing files: {str(e)}"}
 
-def get_conversation_history(user_id, limit=5):
-    """Get recent conversation history for context"""
-    try:
+# Background ingestion of uploaded files
+ingestion_queue = IngestionQueue(app, process_user_files)
+
+# Prompt and chain are built once, by the warmup thread or on first use, and shared by all requests
+RAG_PROMPT_TEMPLATE = """You are an AI assistant helping users understand documents. Use the following pieces of context to answer the question at the end. 
+
+Consider the conversation history to maintain context and provide relevant follow-up responses. If you don't know the answer, just say that you don't know, don't try to make up an answer.
+
+Document Context: {context}
+
+Conversation History:
+{conversation_history}
+
+Current Question: {question}
+
+Answer:"""
+_rag_chain = None
+_rag_chain_lock = threading.Lock()
+
+def get_rag_chain():
+    global _rag_chain
+    if _rag_chain is None:
+        with _rag_chain_lock:
+            if _rag_chain is None:
+                from langchain_core.prompts import PromptTemplate
+                from llm import get_llm
+                prompt = PromptTemplate(
+                    template=RAG_PROMPT_TEMPLATE,
+                    input_variables=["context", "conversation_history", "question"]
+                )
+                _rag_chain = prompt | get_llm()
+    return _rag_chain
+
+# Every generation goes through admission control in front of the model
+llm_scheduler = LLMScheduler()
+
+def invoke_llm(user_id, generation):
+    """Generate an answer in a scheduler slot; identical prompts in flight share one generation"""
+    prompt_key = hashlib.sha256(json.dumps(generation["inputs"], sort_keys=True).encode('utf-8')).hexdigest()
+    return llm_scheduler.run(user_id, prompt_key, lambda: get_rag_chain().invoke(generation["inputs"]))
+
+def llm_busy_response(error):
+    response = jsonify({'success': False, 'message': str(error), 'retry_after': error.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def load_recent_turns(user_id, limit):
+    """Last limit (user_message, bot_message) turns of a user from the database, oldest first"""
+    # Read queued entries before the table so an entry committed in between is seen at least once
+    pending = history_writer.pending_for(user_id) if history_writer is not None else []
+    with timed('history_query'):
         recent_history = ChatHistory.query.filter_by(user_id=user_id)\
             .order_by(ChatHistory.timestamp.desc())\
             .limit(limit)\
             .all()
-        
-        # Reverse to get chronological order
-        recent_history.reverse()
-        
-        conversation = []
-        for entry in recent_history:
-            conversation.append(f"Human: {entry.user_message}")
-            if entry.bot_message:
-                conversation.append(f"Assistant: {entry.bot_message}")
-        
-        return "\n".join(conversation)
+    
+    # Reverse to get chronological order
+    recent_history.reverse()
+    
+    if pending:
+        stored_ids = {entry.id for entry in recent_history}
+        recent_history += [entry for entry in pending if entry.id not in stored_ids]
+        recent_history = sorted(recent_history, key=lambda entry: entry.timestamp)[-limit:]
+    
+    return [(entry.user_message, entry.bot_message) for entry in recent_history]
+
+history_window = HistoryWindow(load_recent_turns)
+
+def get_conversation_turns(user_id):
+    """Get recent conversation turns for context"""
+    try:
+        return history_window.get(user_id)
     except Exception as e:
         app.logger.error(f"Error getting conversation history: {str(e)}")
-        return ""
+        return []
 
-def generate_response(user_id, user_input):
-    """Generate a response using the RAG system with conversation context"""
-    if user_id not in user_retrievers:
-        return {"success": False, "message": "Please upload and process files first"}
-    
-    retriever = user_retrievers[user_id]
+def parse_search_options(data):
+    """Optional per-request retrieval settings (k, fetch_k, sources, nprobe, ef_search)"""
+    options = {}
+    limits = {'k': RETRIEVAL_MAX_K, 'fetch_k': RETRIEVAL_MAX_FETCH_K, 'nprobe': None, 'ef_search': None}
+    for name, limit in limits.items():
+        if data.get(name) is not None:
+            value = data[name]
+            if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+                raise ValueError(f"{name} must be a positive integer")
+            if limit is not None and value > limit:
+                raise ValueError(f"{name} must be at most {limit}")
+            options[name] = value
+    if 'k' in options and 'fetch_k' in options and options['fetch_k'] < options['k']:
+        raise ValueError("fetch_k must be at least k")
     
-    try:
-        import time
-        # Create the LLM
-        llm = Ollama(model="deepseek-r1:1.5b")
-        
-        # Get conversation history for context
-        conversation_history = get_conversation_history(user_id, limit=5)
-        
-        # Create the prompt template with conversation context
-        template = """You are an AI assistant helping users understand documents. Use the following pieces of context to answer the question at the end. 
+    # Scope retrieval to some of the user's files, by file name
+    sources = data.get('sources')
+    if sources is not None:
+        if not isinstance(sources, list) or not sources or not all(isinstance(s, str) and s for s in sources):
+            raise ValueError("sources must be a non-empty list of file names")
+        options['sources'] = sources
+    return options
 
-Consider the conversation history to maintain context and provide relevant follow-up responses. If you don't know the answer, just say that you don't know, don't try to make up an answer.
+def prepare_generation(user_id, retriever, user_input, search_options=None):
+    """Retrieve context for a question and build the prompt inputs"""
+    # Get conversation history for context
+    turns = get_conversation_turns(user_id)
+    
+    # The query embedding is shared by retrieval and the answer cache
+    with timed('embedding'):
+        query_vector = get_embedder().embed_query(user_input)
+    
+    # Get relevant documents (vector search latency)
+    start_time = time.time()
+    with timed('retrieval'):
+        docs = retriever.invoke(user_input, query_vector, **(search_options or {}))
+    vector_search_latency_ms = (time.time() - start_time) * 1000
+    app.logger.info(f"Vector search latency: {vector_search_latency_ms:.2f} ms for user {user_id}")
+    
+    return build_generation(user_input, docs, turns, vector_search_latency_ms,
+                            (retriever.metadata or {}).get("corpus_version"), query_vector)
 
-Document Context: {context}
+def build_generation(user_input, docs, turns, vector_search_latency_ms, corpus_version, query_vector=None):
+    """Build the prompt inputs for a question from its retrieved documents"""
+    # Fit the best chunks and the latest turns into the token budget
+    chunks, turns, context_tokens = pack_context(dedupe_chunks([doc.page_content for doc in docs]), turns)
+    PROMPT_TOKENS.observe(context_tokens + estimate_tokens(user_input))
+    
+    # Get sources of the chunks that made it into the prompt
+    kept = set(chunks)
+    sources = list(set([doc.metadata.get('source', 'Unknown') for doc in docs if doc.page_content in kept]))
+    if chunks and not sources:
+        # Only a truncated top chunk fit
+        sources = [docs[0].metadata.get('source', 'Unknown')]
+    
+    return {
+        "inputs": {
+            "context": "\n\n".join(chunks),
+            "conversation_history": format_history(turns),
+            "question": user_input
+        },
+        "chunks": chunks,
+        "sources": sources,
+        "vector_search_latency_ms": round(vector_search_latency_ms, 2),
+        "corpus_version": corpus_version,
+        "query_vector": query_vector
+    }
 
-Conversation History:
-{conversation_history}
+def lookup_cached_answer(user_id, generation):
+    if answer_cache is None:
+        return None
+    question = generation["inputs"]["question"]
+    return answer_cache.lookup(user_id, question, generation["chunks"], generation["corpus_version"],
+                               generation["query_vector"])
 
-Current Question: {question}
+def store_cached_answer(user_id, generation, answer):
+    if answer_cache is None:
+        return
+    question = generation["inputs"]["question"]
+    answer_cache.store(user_id, question, generation["chunks"], generation["corpus_version"], answer,
+                       generation["query_vector"])
 
-Answer:"""
-        
-        prompt = PromptTemplate(
-            template=template,
-            input_variables=["context", "conversation_history", "question"]
-        )
-        
-        # Create the chain
-        chain = LLMChain(llm=llm, prompt=prompt)
-        
-        # Get relevant documents (vector search latency)
-        start_time = time.time()
-        docs = retriever.get_relevant_documents(user_input)
-        vector_search_latency_ms = (time.time() - start_time) * 1000
-        app.logger.info(f"Vector search latency: {vector_search_latency_ms:.2f} ms for user {user_id}")
+def generate_response(user_id, user_input, search_options=None):
+    """Generate a response using the RAG system with conversation context"""
+    try:
+        retriever = user_retrievers.get(user_id)
+        if retriever is None:
+            return {"success": False, "message": "Please upload and process files first"}
         
-        # Combine documents
-        combined_docs = "\n\n".join([doc.page_content for doc in docs])
+        generation = prepare_generation(user_id, retriever, user_input, search_options)
         
-        # Generate response with conversation context
-        response = chain.run(
-            context=combined_docs, 
-            conversation_history=conversation_history,
-            question=user_input
-        )
-        
-        # Get sources
-        sources = list(set([doc.metadata.get('source', 'Unknown') for doc in docs]))
+        # Reuse an earlier answer for the same question over the same context
+        response = lookup_cached_answer(user_id, generation)
+        cached = response is not None
+        if not cached:
+            # Generate response with conversation context
+            with timed('llm_generation'):
+                response = invoke_llm(user_id, generation)
+            store_cached_answer(user_id, generation, response)
         
         return {
             "success": True,
             "message": response,
-            "sources": sources,
-            "vector_search_latency_ms": round(vector_search_latency_ms, 2)
+            "sources": generation["sources"],
+            "vector_search_latency_ms": generation["vector_search_latency_ms"],
+            "cached": cached
         }
+    except LLMSchedulerBusy:
+        raise
+    except UnknownSources as e:
+        return {"success": False, "message": str(e)}
     except Exception as e:
         return {"success": False, "message": f"Error generating response: {str(e)}"}
 
+def generate_batch_responses(user_id, questions, search_options=None):
+    """Answer several questions: one embedding batch, one FAISS search, bounded concurrent generation"""
+    retriever = user_retrievers.get(user_id)
+    if retriever is None:
+        return {"success": False, "message": "Please upload and process files first"}
+    
+    # Questions in a batch are answered independently against the same history
+    turns = get_conversation_turns(user_id)
+    
+    with timed('embedding'):
+        vectors = get_embedder().embed_queries(questions)
+    start_time = time.time()
+    try:
+        with timed('retrieval'):
+            docs_per_question = retriever.invoke_batch(questions, vectors, **(search_options or {}))
+    except UnknownSources as e:
+        return {"success": False, "message": str(e)}
+    vector_search_latency_ms = (time.time() - start_time) * 1000
+    corpus_version = (retriever.metadata or {}).get("corpus_version")
+    generations = [
+        build_generation(question, docs, turns, vector_search_latency_ms, corpus_version, vector)
+        for question, docs, vector in zip(questions, docs_per_question, vectors)
+    ]
+    
+    results = []
+    pending = []
+    for i, generation in enumerate(generations):
+        answer = lookup_cached_answer(user_id, generation)
+        results.append({"question": questions[i], "success": True, "message": answer, "cached": answer is not None})
+        if answer is None:
+            pending.append(i)
+    
+    def generate(generation):
+        start = time.perf_counter()
+        answer = invoke_llm(user_id, generation)
+        return answer, (time.perf_counter() - start) * 1000
+    
+    with timed('llm_generation'):
+        with ThreadPoolExecutor(max_workers=max(1, min(CHAT_BATCH_CONCURRENCY, len(pending)))) as pool:
+            futures = [(i, pool.submit(generate, generations[i])) for i in pending]
+            for i, future in futures:
+                try:
+                    answer, generation_ms = future.result()
+                except LLMSchedulerBusy as e:
+                    results[i].update(success=False, message=str(e), retry_after=e.retry_after)
+                    continue
+                except Exception as e:
+                    results[i].update(success=False, message=f"Error generating response: {str(e)}")
+                    continue
+                store_cached_answer(user_id, generations[i], answer)
+                results[i].update(message=answer, llm_generation_ms=round(generation_ms, 2))
+    
+    for result, generation in zip(results, generations):
+        result["sources"] = generation["sources"]
+        result["timings"] = {
+            "vector_search_latency_ms": generation["vector_search_latency_ms"],
+            "llm_generation_ms": result.pop("llm_generation_ms", 0.0)
+        }
+    return {"success": True, "results": results}
+
+def save_chat_entries(user_id, exchanges):
+    """Save (user_message, bot_message, sources) exchanges to the user's history in one transaction"""
+    chat_entries = [
+        ChatHistory(
+            id=str(uuid.uuid4()),
+            user_id=user_id,
+            user_message=user_message,
+            bot_message=bot_message,
+            sources=sources,
+            timestamp=datetime.utcnow()
+        )
+        for user_message, bot_message, sources in exchanges
+    ]
+    if history_writer is not None:
+        # Write-behind: the ids are already known, the rows are inserted with the next batch
+        for chat_entry in chat_entries:
+            history_writer.add(chat_entry)
+    else:
+        with timed('history_commit'):
+            db.session.add_all(chat_entries)
+            db.session.commit()
+    for chat_entry in chat_entries:
+        history_window.append(user_id, chat_entry.user_message, chat_entry.bot_message)
+    return chat_entries
+
+def save_chat_entry(user_id, user_message, bot_message, sources):
+    """Save a chat exchange to the user's history"""
+    return save_chat_entries(user_id, [(user_message, bot_message, sources)])[0]
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Request metrics
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.metrics_endpoint = request.endpoint or 'unknown'
+    IN_FLIGHT.inc(endpoint=g.metrics_endpoint)
+    begin_timings(g.metrics_endpoint)
+
+@app.after_request
+def record_response_status(response):
+    g.response_status = response.status_code
+    failed = response.status_code >= 400
+    if not failed and response.is_json and not response.is_streamed:
+        failed = (response.get_json(silent=True) or {}).get('success') is False
+    if failed:
+        ERRORS.inc(endpoint=g.get('metrics_endpoint', 'unknown'), status=str(response.status_code))
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    if 'request_start' not in g:
+        return
+    status = 500 if exc is not None else g.get('response_status', 500)
+    REQUEST_LATENCY.observe(time.perf_counter() - g.request_start, endpoint=g.metrics_endpoint, status=str(status))
+    IN_FLIGHT.dec(endpoint=g.metrics_endpoint)
+    end_timings()
+
+def collect_cache_metrics():
+    samples = []
+    retriever_stats = user_retrievers.stats()
+    for name in ('hits', 'misses', 'loads', 'load_errors', 'evictions', 'reloads'):
+        samples.append((f'proxima_retriever_cache_{name}_total', 'counter', f'Retriever cache {name.replace("_", " ")}', [({}, retriever_stats[name])]))
+    samples.append(('proxima_retriever_cache_load_time_ms_total', 'counter', 'Time spent loading indexes from disk', [({}, retriever_stats['load_time_ms'])]))
+    samples.append(('proxima_retriever_cache_entries', 'gauge', 'Retrievers held in memory', [({}, retriever_stats['entries'])]))
+    samples.append(('proxima_retriever_cache_bytes', 'gauge', 'Estimated size of cached retrievers', [({}, retriever_stats['bytes'])]))
+    if answer_cache is not None:
+        answer_stats = answer_cache.stats()
+        for name in ('hits', 'near_hits', 'misses', 'evictions'):
+            samples.append((f'proxima_answer_cache_{name}_total', 'counter', f'Answer cache {name.replace("_", " ")}', [({}, answer_stats[name])]))
+        samples.append(('proxima_answer_cache_entries', 'gauge', 'Cached answers', [({}, answer_stats['entries'])]))
+    return samples
+
+registry.add_collector(collect_cache_metrics)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: 503 until every subsystem has been warmed up"""
+    report = startup.report()
+    return jsonify(report), 200 if report['ready'] else 503
+
+def password_hasher_busy_response(error):
+    response = jsonify({'success': False, 'message': str(error)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(PASSWORD_HASH_RETRY_AFTER)
+    return response
+
 # Routes
 @app.route('/api/auth/register', methods=['POST'])
 def register():
@@ -267,12 +638,15 @@ def register():
     
     try:
         # Create new user
+        with timed('password_hash'):
+            password_hash = password_hasher.hash(data['password'])
         user = User(
             email=data['email'],
-            password_hash=bcrypt.generate_password_hash(data['password']).decode('utf-8')
+            password_hash=password_hash
         )
-        db.session.add(user)
-        db.session.commit()
+        with timed('db_commit'):
+            db.session.add(user)
+            db.session.commit()
         
         # Generate token
         token = generate_token(user.id, user.email)
@@ -283,6 +657,8 @@ def register():
             'token': token,
             'user': user.to_dict()
         })
+    except PasswordHasherBusy as e:
+        return password_hasher_busy_response(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Registration failed: {str(e)}'}), 500
@@ -296,13 +672,23 @@ def login():
     
     try:
         # Find user
-        user = User.query.filter_by(email=data['email']).first()
+        with timed('user_query'):
+            user = User.query.filter_by(email=data['email']).first()
         
-        if not user or not bcrypt.check_password_hash(user.password_hash, data['password']):
+        with timed('password_check'):
+            password_ok = user is not None and password_hasher.check(user.password_hash, data['password'])
+        if not password_ok:
             return jsonify({'success': False, 'message': 'Invalid email or password'}), 401
         
+        # Upgrade hashes made with an older cost factor while the password is at hand
+        if password_hasher.needs_rehash(user.password_hash):
+            with timed('password_rehash'):
+                user.password_hash = password_hasher.hash(data['password'])
+                db.session.commit()
+        
         # Generate token
-        token = generate_token(user.id, user.email)
+        with timed('token_encode'):
+            token = generate_token(user.id, user.email)
         
         return jsonify({
             'success': True,
@@ -310,7 +696,10 @@ def login():
             'token': token,
             'user': user.to_dict()
         })
+    except PasswordHasherBusy as e:
+        return password_hasher_busy_response(e)
     except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'message': f'Login failed: {str(e)}'}), 500
 
 @app.route('/api/upload', methods=['POST'])
@@ -332,30 +721,154 @@ def upload_file(current_user):
     if file_count >= MAX_FILES:
         return jsonify({'success': False, 'message': f'Maximum of {MAX_FILES} files allowed'}), 400
     
+    tmp_path = None
+    file_path = None
     try:
-        # Save file
+        # Stream the file to disk, hashing it on the way and rejecting non-PDFs early
         filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{current_user}_{filename}")
-        file.save(file_path)
+        sniffer = PdfSniffer()
+        def check_block(block):
+            sniffer.feed(block)
+            if sniffer.is_pdf is False:
+                raise UploadError('File is not a PDF')
+        with timed('blob_write'):
+            tmp_path, sha256, size = blob_store.write_stream(file.stream, on_block=check_block)
+        if not sniffer.is_pdf:
+            raise UploadError('File is not a PDF')
         
-        # Create file record
-        new_file = File(
-            user_id=current_user,
-            name=filename,
-            path=file_path,
-            size=os.path.getsize(file_path)
-        )
-        db.session.add(new_file)
-        db.session.commit()
+        # Point the file record at the shared blob
+        with timed('db_commit'):
+            file_path = blob_store.add_reference(tmp_path, sha256, size)
+            new_file = File(
+                user_id=current_user,
+                name=filename,
+                path=file_path,
+                size=size,
+                blob_sha256=sha256
+            )
+            db.session.add(new_file)
+            db.session.commit()
         
         return jsonify({
             'success': True,
             'message': 'File uploaded successfully',
             'file': new_file.to_dict()
         })
+    except UploadError as e:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return upload_error_response(e)
+    except Exception as e:
+        db.session.rollback()
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        elif file_path:
+            # The bytes were moved into the blob store but the record never committed
+            blob_store.abandon(sha256)
+        return jsonify({'success': False, 'message': f'Upload failed: {str(e)}'}), 500
+
+def upload_error_response(error):
+    body = {'success': False, 'message': str(error)}
+    if isinstance(error, UploadOffsetMismatch):
+        body['offset'] = error.offset
+    return jsonify(body), error.status
+
+# Resumable uploads: create, send parts with PUT at the current offset, then complete.
+# An interrupted part is resumed from the offset GET reports.
+@app.route('/api/uploads', methods=['POST'])
+@token_required
+def create_upload(current_user):
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(str(data.get('filename', '')))
+    if not filename or not allowed_file(filename):
+        return jsonify({'success': False, 'message': 'Invalid file type'}), 400
+    size = data.get('size')
+    if not isinstance(size, int) or isinstance(size, bool):
+        return jsonify({'success': False, 'message': 'size must be the file size in bytes'}), 400
+    if File.query.filter_by(user_id=current_user).count() >= MAX_FILES:
+        return jsonify({'success': False, 'message': f'Maximum of {MAX_FILES} files allowed'}), 400
+
+    try:
+        upload = upload_sessions.create(current_user, filename, size)
+    except UploadError as e:
+        return upload_error_response(e)
+    return jsonify({'success': True, 'upload': upload}), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+@token_required
+def get_upload(current_user, upload_id):
+    try:
+        return jsonify({'success': True, 'upload': upload_sessions.status(current_user, upload_id)})
+    except UploadError as e:
+        return upload_error_response(e)
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+@token_required
+def append_upload(current_user, upload_id):
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'success': False, 'message': 'offset is required'}), 400
+    try:
+        with timed('blob_write'):
+            upload = upload_sessions.append(current_user, upload_id, offset, request.stream)
+    except UploadError as e:
+        return upload_error_response(e)
+    return jsonify({'success': True, 'upload': upload})
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+@token_required
+def complete_upload(current_user, upload_id):
+    data = request.get_json(silent=True) or {}
+    try:
+        path, sha256, size, pages = upload_sessions.complete(current_user, upload_id, data.get('sha256'))
+        filename = upload_sessions.meta(current_user, upload_id)['filename']
+    except UploadError as e:
+        return upload_error_response(e)
+    if File.query.filter_by(user_id=current_user).count() >= MAX_FILES:
+        return jsonify({'success': False, 'message': f'Maximum of {MAX_FILES} files allowed'}), 400
+
+    file_path = None
+    try:
+        with timed('db_commit'):
+            file_path = blob_store.add_reference(path, sha256, size)
+            new_file = File(user_id=current_user, name=filename, path=file_path, size=size, blob_sha256=sha256)
+            db.session.add(new_file)
+            db.session.commit()
     except Exception as e:
         db.session.rollback()
+        if file_path:
+            # The upload's bytes were moved into the blob store but the record never committed
+            blob_store.abandon(sha256)
+            upload_sessions.discard(upload_id)
         return jsonify({'success': False, 'message': f'Upload failed: {str(e)}'}), 500
+    upload_sessions.discard(upload_id)
+
+    # Optionally start processing as soon as the file has landed
+    job = None
+    message = 'File uploaded successfully'
+    if data.get('process', UPLOAD_AUTO_PROCESS):
+        try:
+            job, created = ingestion_queue.submit(current_user)
+            message = 'File uploaded, processing started' if created else 'File uploaded, processing already queued'
+        except IngestionQueueFull as e:
+            message = f'File uploaded, but processing could not be queued: {str(e)}'
+
+    return jsonify({
+        'success': True,
+        'message': message,
+        'file': new_file.to_dict(),
+        'pages': pages,
+        'job': job.to_dict() if job else None
+    })
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+@token_required
+def abort_upload(current_user, upload_id):
+    try:
+        upload_sessions.abort(current_user, upload_id)
+    except UploadError as e:
+        return upload_error_response(e)
+    return jsonify({'success': True, 'message': 'Upload cancelled'})
 
 @app.route('/api/files', methods=['GET'])
 @token_required
@@ -377,13 +890,20 @@ def delete_file(current_user, file_id):
         if not file:
             return jsonify({'success': False, 'message': 'File not found'}), 404
         
-        # Delete physical file
-        if os.path.exists(file.path):
-            os.remove(file.path)
-        
-        # Delete from database
+        # Delete from database, removing the stored bytes once no file uses them
         db.session.delete(file)
-        db.session.commit()
+        if file.blob_sha256:
+            blob_store.release(file.blob_sha256)
+        else:
+            db.session.commit()
+            if os.path.exists(file.path):
+                os.remove(file.path)
+        
+        # Remove the file's vectors from the user's index in the background
+        try:
+            ingestion_queue.submit(current_user, remove=[file_id])
+        except IngestionQueueFull as e:
+            app.logger.warning(f"Could not queue index cleanup for user {current_user}: {str(e)}")
         
         return jsonify({'success': True, 'message': 'File deleted successfully'})
     except Exception as e:
@@ -393,8 +913,29 @@ def delete_file(current_user, file_id):
 @app.route('/api/process', methods=['POST'])
 @token_required
 def process_files(current_user):
-    result = process_user_files(current_user)
-    return jsonify(result)
+    if File.query.filter_by(user_id=current_user).count() == 0:
+        return jsonify({"success": False, "message": "No files uploaded"})
+
+    try:
+        with timed('enqueue'):
+            job, created = ingestion_queue.submit(current_user)
+    except IngestionQueueFull as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
+
+    return jsonify({
+        'success': True,
+        'message': 'Processing started' if created else 'Processing already queued',
+        'job': job.to_dict()
+    }), 202
+
+@app.route('/api/process/status', methods=['GET'])
+@token_required
+def process_status(current_user):
+    job = ingestion_queue.get(current_user)
+    if not job:
+        return jsonify({'success': False, 'message': 'No processing job found'}), 404
+
+    return jsonify({'success': True, 'job': job.to_dict()})
 
 @app.route('/api/chat', methods=['POST'])
 @token_required
@@ -404,36 +945,210 @@ def chat(current_user):
     if not data or not data.get('message'):
         return jsonify({'success': False, 'message': 'No message provided'}), 400
     
+    try:
+        search_options = parse_search_options(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
     try:
         # Generate response
-        response = generate_response(current_user, data['message'])
+        response = generate_response(current_user, data['message'], search_options)
         
         if response['success']:
             # Save to chat history
-            chat_entry = ChatHistory(
-                user_id=current_user,
-                user_message=data['message'],
-                bot_message=response['message'],
-                sources=response.get('sources', [])
+            chat_entry = save_chat_entry(
+                current_user, data['message'], response['message'], response.get('sources', [])
             )
-            db.session.add(chat_entry)
-            db.session.commit()
-            
             response['chat_id'] = chat_entry.id
         
+        if data.get('timings'):
+            response['timings'] = current_timings()
+        
         return jsonify(response)
+    except LLMSchedulerBusy as e:
+        return llm_busy_response(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Chat failed: {str(e)}'}), 500
 
+@app.route('/api/chat/batch', methods=['POST'])
+@token_required
+def chat_batch(current_user):
+    data = request.get_json()
+    questions = data.get('questions') if data else None
+    
+    if not questions or not isinstance(questions, list):
+        return jsonify({'success': False, 'message': 'No questions provided'}), 400
+    if len(questions) > CHAT_BATCH_MAX_QUESTIONS:
+        return jsonify({'success': False, 'message': f'At most {CHAT_BATCH_MAX_QUESTIONS} questions per batch'}), 400
+    if not all(isinstance(question, str) and question.strip() for question in questions):
+        return jsonify({'success': False, 'message': 'Questions must be non-empty strings'}), 400
+    
+    try:
+        search_options = parse_search_options(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        response = generate_batch_responses(current_user, questions, search_options)
+        
+        if response['success']:
+            # Save all answered questions to chat history in one transaction
+            answered = [result for result in response['results'] if result['success']]
+            chat_entries = save_chat_entries(
+                current_user, [(result['question'], result['message'], result['sources']) for result in answered]
+            )
+            for result, chat_entry in zip(answered, chat_entries):
+                result['chat_id'] = chat_entry.id
+        
+        if data.get('timings'):
+            response['timings'] = current_timings()
+        
+        return jsonify(response)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Chat failed: {str(e)}'}), 500
+
+@app.route('/api/chat/stream', methods=['POST'])
+@token_required
+def chat_stream(current_user):
+    """Stream the answer as Server-Sent Events: token events, then a done event with sources"""
+    data = request.get_json()
+    
+    if not data or not data.get('message'):
+        return jsonify({'success': False, 'message': 'No message provided'}), 400
+    
+    try:
+        search_options = parse_search_options(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        retriever = user_retrievers.get(current_user)
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error loading index: {str(e)}'}), 500
+    if retriever is None:
+        return jsonify({"success": False, "message": "Please upload and process files first"})
+    try:
+        retriever.resolve_sources(search_options.get('sources'))
+    except UnknownSources as e:
+        return jsonify({"success": False, "message": str(e)})
+    
+    user_message = data['message']
+    
+    want_timings = bool(data.get('timings'))
+    
+    # Take a model slot before the stream starts so overload can still be answered with a 429
+    try:
+        lease = llm_scheduler.acquire(current_user)
+    except LLMSchedulerBusy as e:
+        return llm_busy_response(e)
+    
+    def events():
+        # The response body is produced after the request hooks ran, so time it separately
+        begin_timings('chat_stream')
+        tokens = None
+        try:
+            generation = prepare_generation(current_user, retriever, user_message, search_options)
+            
+            answer = lookup_cached_answer(current_user, generation)
+            cached = answer is not None
+            if cached:
+                lease.release()
+                yield sse_event('token', {'token': answer})
+            else:
+                tokens = get_rag_chain().stream(generation["inputs"])
+                parts = []
+                with timed('llm_generation'):
+                    for token in tokens:
+                        parts.append(token)
+                        yield sse_event('token', {'token': token})
+                lease.release()
+                answer = "".join(parts)
+                store_cached_answer(current_user, generation, answer)
+            
+            # Save to chat history once the full answer is known
+            chat_entry = save_chat_entry(current_user, user_message, answer, generation["sources"])
+            
+            yield sse_event('done', {
+                'success': True,
+                'chat_id': chat_entry.id,
+                'sources': generation["sources"],
+                'vector_search_latency_ms': generation["vector_search_latency_ms"],
+                'cached': cached,
+                **({'timings': current_timings()} if want_timings else {})
+            })
+        except GeneratorExit:
+            # Client went away; stop pulling tokens from the model and drop the answer
+            app.logger.info(f"Chat stream closed by client for user {current_user}")
+        except Exception as e:
+            db.session.rollback()
+            yield sse_event('error', {'success': False, 'message': f'Chat failed: {str(e)}'})
+        finally:
+            if tokens is not None:
+                tokens.close()
+            lease.release()
+            end_timings()
+    
+    response = Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # The generator never runs if the client leaves before the first read
+    response.call_on_close(lease.release)
+    return response
+
+def encode_history_cursor(entry):
+    """Opaque cursor pointing just past entry in (timestamp, id) order"""
+    raw = f"{entry.timestamp.isoformat()}|{entry.id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_history_cursor(cursor):
+    timestamp, entry_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|', 1)
+    return datetime.fromisoformat(timestamp), entry_id
+
 @app.route('/api/history', methods=['GET'])
 @token_required
 def get_history(current_user):
     try:
-        history = ChatHistory.query.filter_by(user_id=current_user).order_by(ChatHistory.timestamp.desc()).all()
+        limit = min(max(int(request.args.get('limit', HISTORY_PAGE_SIZE)), 1), HISTORY_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'limit must be an integer'}), 400
+
+    # Entries still queued by the history writer are merged into the page rather than flushed first;
+    # they are read before the table so an entry committed in between is seen at least once
+    pending = history_writer.pending_for(current_user) if history_writer is not None else []
+    
+    query = ChatHistory.query.filter_by(user_id=current_user)
+    before = request.args.get('before')
+    if before:
+        try:
+            before_timestamp, before_id = decode_history_cursor(before)
+        except (ValueError, UnicodeDecodeError):
+            return jsonify({'success': False, 'message': 'Invalid cursor'}), 400
+        # Keyset condition on (timestamp, id) so entries sharing a timestamp are neither skipped nor repeated
+        query = query.filter(db.or_(
+            ChatHistory.timestamp < before_timestamp,
+            db.and_(ChatHistory.timestamp == before_timestamp, ChatHistory.id < before_id)
+        ))
+        pending = [entry for entry in pending if (entry.timestamp, entry.id) < (before_timestamp, before_id)]
+
+    try:
+        with timed('history_query'):
+            # One extra row tells whether an older page exists without a separate count
+            entries = query.order_by(ChatHistory.timestamp.desc(), ChatHistory.id.desc()).limit(limit + 1).all()
+        if pending:
+            stored_ids = {entry.id for entry in entries}
+            entries += [entry for entry in pending if entry.id not in stored_ids]
+            entries = sorted(entries, key=lambda entry: (entry.timestamp, entry.id), reverse=True)[:limit + 1]
+        has_more = len(entries) > limit
+        entries = entries[:limit]
         return jsonify({
             'success': True,
-            'history': [entry.to_dict() for entry in history]
+            'history': [entry.to_dict() for entry in entries],
+            'has_more': has_more,
+            'next_cursor': encode_history_cursor(entries[-1]) if has_more else None
         })
     except Exception as e:
         return jsonify({'success': False, 'message': f'Failed to fetch history: {str(e)}'}), 500
@@ -442,8 +1157,11 @@ def get_history(current_user):
 @token_required
 def clear_history(current_user):
     try:
+        if history_writer is not None:
+            history_writer.discard_user(current_user)
         ChatHistory.query.filter_by(user_id=current_user).delete()
         db.session.commit()
+        history_window.invalidate(current_user)
         return jsonify({'success': True, 'message': 'Chat history cleared'})
     except Exception as e:
         db.session.rollback()
@@ -453,12 +1171,15 @@ def clear_history(current_user):
 @token_required
 def delete_history_item(current_user, history_id):
     try:
+        if history_writer is not None:
+            history_writer.flush()
         chat_entry = ChatHistory.query.filter_by(id=history_id, user_id=current_user).first()
         if not chat_entry:
             return jsonify({'success': False, 'message': 'Chat entry not found'}), 404
         
         db.session.delete(chat_entry)
         db.session.commit()
+        history_window.invalidate(current_user)
         
         return jsonify({'success': True, 'message': 'Chat entry deleted'})
     except Exception as e:
@@ -471,7 +1192,9 @@ def get_user_status(current_user):
     try:
         file_count = File.query.filter_by(user_id=current_user).count()
         has_retriever = current_user in user_retrievers
-        has_history = ChatHistory.query.filter_by(user_id=current_user).count() > 0
+        job = ingestion_queue.get(current_user)
+        has_history = bool(history_writer is not None and history_writer.pending_for(current_user)) or \
+            db.session.query(ChatHistory.query.filter_by(user_id=current_user).exists()).scalar()
         
         return jsonify({
             'success': True,
@@ -479,15 +1202,50 @@ def get_user_status(current_user):
                 'has_files': file_count > 0,
                 'has_retriever': has_retriever,
                 'has_history': has_history,
-                'file_count': file_count
+                'file_count': file_count,
+                'processing_status': job.status if job else None
             }
         })
     except Exception as e:
         return jsonify({'success': False, 'message': f'Failed to get user status: {str(e)}'}), 500
 
-# Create database tables
-with app.app_context():
-    db.create_all()
+@app.route('/api/system/stats', methods=['GET'])
+@token_required
+def get_system_stats(current_user):
+    return jsonify({
+        'success': True,
+        'stats': {
+            'retriever_cache': user_retrievers.stats(),
+            'answer_cache': answer_cache.stats() if answer_cache else None,
+            'history_writer': history_writer.stats() if history_writer else None,
+            'history_window': history_window.stats(),
+            'llm_scheduler': llm_scheduler.stats()
+        }
+    })
+
+def create_tables():
+    with app.app_context():
+        db.create_all()
+
+def warm_embedding_model():
+    get_embedder().embed_query('warmup')
+
+startup.record('app_setup', (time.perf_counter() - _setup_start) * 1000)
+
+# Requests need the schema, so it exists before anything is served; a database that
+# is not reachable fails the boot and leaves the restart to the supervisor
+if not in_child_process():
+    with startup.phase('database'):
+        create_tables()
+
+# Load everything the first chat would otherwise wait for, in the background
+startup.start_warmup([
+    ('llm', get_rag_chain),
+    ('vector_index', lambda: importlib.import_module('vector_index')),
+    ('text_splitter', lambda: importlib.import_module('chunking')),
+    ('embedding_model', warm_embedding_model)
+], logger=app.logger)
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # Development server only; use gunicorn with gunicorn.conf.py in production
+    app.run(debug=os.environ.get('FLASK_DEBUG', '0') == '1')
\ No newline at end of file
@@ -0,0 +1,100 @@
+import sys
+import json
+import time
+import tempfile
+import argparse
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from chunking import Chunker, CHUNKING_MODES
+from embeddings import BatchedEmbeddings, _load_huggingface_model
+from pdf_parsing import count_pages, extract_page_range
+from vector_index import UserIndex
+
+
+class CountingEmbeddings(Embeddings):
+    """Counts the texts and characters sent to the model"""
+
+    def __init__(self, embedder):
+        self.embedder = embedder
+        self.texts = 0
+        self.chars = 0
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        self.texts += len(texts)
+        self.chars += sum(len(text) for text in texts)
+        return self.embedder.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def load_pages(paths):
+    pages = []
+    for path in paths:
+        texts = extract_page_range(path, 0, count_pages(path))
+        pages.append([Document(page_content=text, metadata={'source': path, 'page': i}) for i, text in enumerate(texts)])
+    return pages
+
+
+def benchmark(files, modes):
+    # One model for every mode, loaded before timing starts
+    model = BatchedEmbeddings(_load_huggingface_model)
+    model.embed_query('warmup')
+
+    pages_total = sum(len(docs) for docs in files)
+    results = []
+    for mode in modes:
+        embedder = CountingEmbeddings(model)
+        chunker = Chunker(embedder, mode=mode)
+        index = UserIndex.load(tempfile.mkdtemp(), embedder)
+        chunks = 0
+        start = time.perf_counter()
+        for i, docs in enumerate(files):
+            documents, vectors = chunker.split(docs)
+            index.add_file(str(i), docs[0].metadata['source'] if docs else str(i), documents, vectors)
+            chunks += len(documents)
+        elapsed = time.perf_counter() - start
+        results.append({
+            'mode': mode,
+            'pages': pages_total,
+            'chunks': chunks,
+            'seconds': round(elapsed, 2),
+            'pages_per_second': round(pages_total / elapsed, 2) if elapsed else None,
+            'texts_embedded': embedder.texts,
+            'chars_embedded': embedder.chars
+        })
+    return results
+
+
+def print_results(results):
+    print(f"{'Mode':<18}{'Pages':>7}{'Chunks':>8}{'Seconds':>9}{'Pages/s':>9}{'Texts':>8}{'Chars':>11}")
+    for row in results:
+        print(
+            f"{row['mode']:<18}{row['pages']:>7}{row['chunks']:>8}{row['seconds']:>9.2f}"
+            f"{row['pages_per_second'] or 0:>9.2f}{row['texts_embedded']:>8}{row['chars_embedded']:>11}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare ingestion throughput of the chunking modes on a set of PDFs')
+    parser.add_argument('pdfs', nargs='+', help='PDF files to chunk and embed')
+    parser.add_argument('--modes', default=','.join(CHUNKING_MODES))
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    # Pages are extracted once up front; only chunking and embedding are timed
+    files = load_pages(args.pdfs)
+    results = benchmark(files, args.modes.split(','))
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+from embeddings import (OnnxEmbeddings, _load_huggingface_model, ONNX_MODEL_DIR, ONNX_INTRA_OP_THREADS,
+                        EMBEDDING_MAX_BATCH_SIZE)
+
+ONNX_FILES = {'onnx': 'model.onnx', 'onnx_int8': 'model_int8.onnx'}
+
+
+def synthetic_texts(n, seed=0):
+    """Sentences of mixed length; real chunk texts (--texts) give more meaningful parity numbers"""
+    rng = np.random.default_rng(seed)
+    words = ('the contract term payment notice party agreement clause shall within days written '
+             'termination liability data report annual revenue growth model results table figure').split()
+    return [' '.join(rng.choice(words, size=rng.integers(8, 120))) + '.' for _ in range(n)]
+
+
+def load_backends(names, model_dir, threads):
+    backends = {}
+    for name in names:
+        if name == 'torch':
+            backends[name] = _load_huggingface_model()
+        elif os.path.exists(os.path.join(model_dir, ONNX_FILES[name])):
+            backends[name] = OnnxEmbeddings(model_dir, ONNX_FILES[name], intra_op_threads=threads)
+        else:
+            print(f"Skipping {name}: {os.path.join(model_dir, ONNX_FILES[name])} not found (run export_onnx_embeddings.py)")
+    return backends
+
+
+def parity(reference, candidate, texts, queries, k):
+    """Cosine similarity to the reference vectors, and overlap of the top-k texts each query retrieves"""
+    ref_docs = np.asarray(reference.embed_documents(texts), dtype=np.float32)
+    cand_docs = np.asarray(candidate.embed_documents(texts), dtype=np.float32)
+    cosine = np.sum(ref_docs * cand_docs, axis=1) / (
+        np.linalg.norm(ref_docs, axis=1) * np.linalg.norm(cand_docs, axis=1))
+
+    def top_k(docs, query_vectors):
+        distances = ((query_vectors[:, None, :] - docs[None, :, :]) ** 2).sum(axis=2)
+        return np.argsort(distances, axis=1)[:, :k]
+
+    ref_top = top_k(ref_docs, np.asarray([reference.embed_query(q) for q in queries], dtype=np.float32))
+    cand_top = top_k(cand_docs, np.asarray([candidate.embed_query(q) for q in queries], dtype=np.float32))
+    overlap = np.mean([len(set(r) & set(c)) / k for r, c in zip(ref_top, cand_top)])
+    return {
+        'min_cosine': round(float(cosine.min()), 5),
+        'mean_cosine': round(float(cosine.mean()), 5),
+        f'top{k}_overlap': round(float(overlap), 4)
+    }
+
+
+def benchmark(model, texts, queries, batch_size):
+    model.embed_documents(texts[:batch_size])  # Warm up
+    start = time.perf_counter()
+    for offset in range(0, len(texts), batch_size):
+        model.embed_documents(texts[offset:offset + batch_size])
+    encode_s = time.perf_counter() - start
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        model.embed_query(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        'texts_per_second': round(len(texts) / encode_s, 1),
+        'query_p50_ms': round(float(np.percentile(latencies, 50)), 2),
+        'query_p95_ms': round(float(np.percentile(latencies, 95)), 2)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare embedding backends for throughput, query latency and parity')
+    parser.add_argument('--backends', default='torch,onnx,onnx_int8')
+    parser.add_argument('--model-dir', default=ONNX_MODEL_DIR)
+    parser.add_argument('--threads', type=int, default=ONNX_INTRA_OP_THREADS, help='onnxruntime intra-op threads')
+    parser.add_argument('--texts', help='File with one chunk text per line; synthetic sentences are used otherwise')
+    parser.add_argument('--count', type=int, default=512, help='Number of texts to encode')
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--batch-size', type=int, default=EMBEDDING_MAX_BATCH_SIZE)
+    parser.add_argument('-k', type=int, default=4)
+    parser.add_argument('--parity', action='store_true', help='Only check the ONNX vectors against the torch model')
+    parser.add_argument('--min-cosine', type=float, default=0.99, help='Parity fails below this cosine similarity')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    if args.texts:
+        with open(args.texts) as f:
+            texts = [line.strip() for line in f if line.strip()][:args.count]
+    else:
+        texts = synthetic_texts(args.count)
+    queries = [' '.join(text.split()[:12]) for text in texts[:args.queries]]
+
+    names = args.backends.split(',')
+    if 'torch' not in names:
+        names.insert(0, 'torch')  # Reference for the parity check
+    backends = load_backends(names, args.model_dir, args.threads)
+
+    results = []
+    failed = False
+    for name, model in backends.items():
+        row = {'backend': name}
+        if name != 'torch':
+            row.update(parity(backends['torch'], model, texts, queries, args.k))
+            failed = failed or row['min_cosine'] < args.min_cosine
+        if not args.parity:
+            row.update(benchmark(model, texts, queries, args.batch_size))
+        results.append(row)
+        print(json.dumps(row))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if failed:
+        print(f"Parity check failed: cosine similarity below {args.min_cosine}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import os
+import argparse
+
+# Text of the generated benchmark documents, one list of pages per document
+SEED_DOCUMENTS = {
+    'employee_handbook.pdf': [
+        'Employee Handbook. Section 1 covers working hours. Core hours are 10:00 to 16:00.',
+        'Section 2 covers leave. Employees receive 25 days of annual leave per year.',
+        'Section 3 covers expenses. Claims above 500 EUR require manager approval.',
+    ],
+    'security_policy.pdf': [
+        'Security Policy. Clause 4.2 requires passwords of at least 12 characters.',
+        'Clause 4.3 requires multi-factor authentication for remote access.',
+        'Clause 7.1 requires incidents to be reported within 24 hours.',
+    ],
+    'product_faq.pdf': [
+        'Product FAQ. The standard plan includes 10 GB of storage.',
+        'Refunds are available within 30 days of purchase. Order IDs start with PX-.',
+    ],
+}
+
+QUESTIONS = [
+    'What is the summary of the uploaded document?',
+    'How many days of annual leave do employees get?',
+    'What does clause 4.2 require?',
+    'When must incidents be reported?',
+    'How much storage does the standard plan include?',
+    'What is the refund policy?',
+]
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def make_pdf(pages):
+    """Build a small text-only PDF with one page per string"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for i, text in enumerate(pages):
+        page_id = 4 + 2 * i
+        kids.append(f"{page_id} 0 R")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {page_id + 1} 0 R "
+            f"/Resources << /Font << /F1 3 0 R >> >> >>"
+        )
+        stream = f"BT /F1 11 Tf 72 720 Td ({_escape(text)}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>"
+
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n{body}\nendobj\n".encode('latin-1')
+    xref_offset = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        pdf += f"{offset:010d} 00000 n \n".encode()
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    return pdf
+
+
+def seed_pdfs():
+    """Return {filename: pdf_bytes} for the benchmark documents"""
+    return {name: make_pdf(pages) for name, pages in SEED_DOCUMENTS.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write the benchmark seed PDFs to a directory')
+    parser.add_argument('directory')
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    for name, data in seed_pdfs().items():
+        with open(os.path.join(args.directory, name), 'wb') as f:
+            f.write(data)
+        print(f"Wrote {name}")
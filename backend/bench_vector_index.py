@@ -0,0 +1,117 @@
+import sys
+import json
+import time
+import argparse
+
+import faiss
+import numpy as np
+
+from vector_index import INDEX_TYPES, build_search_index, search_parameters, estimate_vector_bytes
+
+
+def synthetic_corpus(n, d, clusters=256, seed=0):
+    """Clustered gaussian vectors, closer to real embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, d)).astype('float32')
+    labels = rng.integers(0, clusters, size=n)
+    return centers[labels] + 0.3 * rng.normal(size=(n, d)).astype('float32')
+
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def run_queries(index, queries, k, params):
+    """Search queries one at a time, as the chat endpoint does; returns ids and per-query latencies in ms"""
+    ids = []
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        if params is None:
+            _, found = index.search(query[None, :], k)
+        else:
+            _, found = index.search(query[None, :], k, params=params)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append(found[0])
+    return np.array(ids), np.array(latencies)
+
+
+def benchmark(vectors, queries, k, index_types, nprobes, ef_searches):
+    flat = build_search_index(vectors, 'flat')
+    truth, _ = run_queries(flat, queries, k, None)
+
+    results = []
+    for index_type in index_types:
+        start = time.perf_counter()
+        index = flat if index_type == 'flat' else build_search_index(vectors, index_type)
+        build_s = time.perf_counter() - start
+
+        if faiss.try_extract_index_ivf(index) is not None:
+            settings = [('nprobe', value) for value in nprobes]
+        elif isinstance(index, faiss.IndexHNSW):
+            settings = [('ef_search', value) for value in ef_searches]
+        else:
+            settings = [(None, None)]
+
+        for name, value in settings:
+            params = search_parameters(index, **({name: value} if name else {}))
+            found, latencies = run_queries(index, queries, k, params)
+            results.append({
+                'index_type': index_type,
+                'setting': f"{name}={value}" if name else '-',
+                f'recall@{k}': round(recall_at_k(found, truth), 4),
+                'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+                'p95_ms': round(float(np.percentile(latencies, 95)), 3),
+                'build_s': round(build_s, 2),
+                'index_mb': round(estimate_vector_bytes(index) / 2 ** 20, 1)
+            })
+    return results
+
+
+def print_results(results, k):
+    print(f"{'Index':<10}{'Setting':<16}{f'Recall@{k}':>10}{'p50 ms':>9}{'p95 ms':>9}{'Build s':>9}{'MB':>8}")
+    for row in results:
+        print(
+            f"{row['index_type']:<10}{row['setting']:<16}{row[f'recall@{k}']:>10.3f}"
+            f"{row['p50_ms']:>9.3f}{row['p95_ms']:>9.3f}{row['build_s']:>9.2f}{row['index_mb']:>8.1f}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare recall and latency of FAISS index types against exact search')
+    parser.add_argument('--embeddings', help='.npy file of corpus vectors; synthetic vectors are used otherwise')
+    parser.add_argument('--vectors', type=int, default=100000, help='Number of synthetic vectors')
+    parser.add_argument('--dim', type=int, default=768, help='Dimension of synthetic vectors')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('-k', type=int, default=4)
+    parser.add_argument('--index-types', default=','.join(INDEX_TYPES))
+    parser.add_argument('--nprobe', default='1,4,16,64')
+    parser.add_argument('--ef-search', default='16,32,64,128')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    if args.embeddings:
+        vectors = np.load(args.embeddings).astype('float32')
+    else:
+        vectors = synthetic_corpus(args.vectors, args.dim)
+    # Queries are perturbed corpus vectors, like questions phrased close to a passage
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), args.queries, replace=False)]
+    queries = queries + 0.1 * rng.normal(size=queries.shape).astype('float32')
+
+    results = benchmark(
+        vectors, queries, args.k, args.index_types.split(','),
+        [int(value) for value in args.nprobe.split(',')],
+        [int(value) for value in args.ef_search.split(',')]
+    )
+    print_results(results, args.k)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
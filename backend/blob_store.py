@@ -0,0 +1,112 @@
+import os
+import uuid
+import hashlib
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Blob
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobStore:
+    """Content-addressed file storage: each distinct upload is stored once, by SHA-256.
+
+    Blob rows count the File rows pointing at them; the bytes are removed when the
+    last reference goes away.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.tmp_dir = os.path.join(root, 'tmp')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path_for(self, sha256):
+        return os.path.join(self.root, sha256[:2], f"{sha256}.pdf")
+
+    def write_stream(self, stream, on_block=None):
+        """Stream an upload to a temporary file while hashing it; returns (tmp_path, sha256, size).
+
+        on_block(block) sees each block before it is written and may raise to reject the upload.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = os.path.join(self.tmp_dir, str(uuid.uuid4()))
+        try:
+            with open(tmp_path, 'wb') as f:
+                for block in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                    if on_block is not None:
+                        on_block(block)
+                    digest.update(block)
+                    size += len(block)
+                    f.write(block)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return tmp_path, digest.hexdigest(), size
+
+    def add_reference(self, tmp_path, sha256, size):
+        """Record one more reference to the blob and move tmp_path's bytes into place.
+
+        Flushes but does not commit, so the caller can commit it with the File row;
+        if that commit fails, the caller rolls back and calls abandon(). The bytes
+        are always moved in, even when the blob seems to exist, since a release()
+        committing at the same time may be deleting them.
+        """
+        path = self.path_for(sha256)
+        if Blob.query.filter_by(sha256=sha256).update({Blob.ref_count: Blob.ref_count + 1}) == 0:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(Blob(sha256=sha256, path=path, size=size, ref_count=1))
+            except IntegrityError:
+                # Another upload of the same content created the row first
+                Blob.query.filter_by(sha256=sha256).update({Blob.ref_count: Blob.ref_count + 1})
+
+        # The row is locked by this transaction now, so no release() can delete the bytes until it ends;
+        # content addressing makes replacing them with an identical copy harmless
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return path
+
+    def abandon(self, sha256):
+        """Delete bytes placed by add_reference() whose transaction was rolled back, unless another row owns them (commits)"""
+        try:
+            if Blob.query.filter_by(sha256=sha256).update({Blob.ref_count: Blob.ref_count}) == 0:
+                # Claim the key so a concurrent upload of the same content waits until the bytes are gone
+                with db.session.begin_nested():
+                    db.session.add(Blob(sha256=sha256, path=self.path_for(sha256), size=0, ref_count=0))
+                if os.path.exists(self.path_for(sha256)):
+                    os.remove(self.path_for(sha256))
+                Blob.query.filter_by(sha256=sha256, ref_count=0).delete()
+            db.session.commit()
+        except IntegrityError:
+            # Another upload owns the blob now
+            db.session.rollback()
+
+    def release(self, sha256):
+        """Drop one reference and delete the blob once nothing points at it (commits).
+
+        The count is decremented and re-checked in one transaction, which holds the
+        row until it ends, so an upload of the same content either still sees the
+        blob or waits and then writes its bytes again.
+        """
+        Blob.query.filter_by(sha256=sha256).update({Blob.ref_count: Blob.ref_count - 1})
+        blob = Blob.query.filter_by(sha256=sha256).populate_existing().first()
+        path = self.path_for(sha256)
+        tombstone = None
+        if blob is not None and blob.ref_count <= 0:
+            db.session.delete(blob)
+            if os.path.exists(path):
+                # Set the bytes aside before committing, so a failed commit can put them back
+                tombstone = os.path.join(self.tmp_dir, f"{uuid.uuid4()}.deleted")
+                os.replace(path, tombstone)
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            if tombstone is not None:
+                os.replace(tombstone, path)
+            raise
+        if tombstone is not None:
+            os.remove(tombstone)
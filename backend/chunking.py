@@ -0,0 +1,121 @@
+import os
+import re
+import copy
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_experimental.text_splitter import SemanticChunker
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# Configuration
+CHUNKING_MODE = os.environ.get('CHUNKING_MODE', 'semantic')
+CHUNK_SIZE = int(os.environ.get('CHUNK_SIZE', 1000))  # Characters, recursive mode
+CHUNK_OVERLAP = int(os.environ.get('CHUNK_OVERLAP', 200))
+
+# semantic: embedding breakpoints, chunks embedded again by the index
+# recursive: fixed-size character windows with overlap, embedded once by the index
+# semantic_pooled: embedding breakpoints, chunk vectors pooled from the sentence embeddings
+CHUNKING_MODES = ('semantic', 'recursive', 'semantic_pooled')
+
+
+class _RecordingEmbeddings(Embeddings):
+    """Passes calls through to embeddings and keeps the vectors of the last embed_documents call"""
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.vectors = None
+
+    def embed_documents(self, texts):
+        self.vectors = self.embeddings.embed_documents(texts)
+        return self.vectors
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+
+class PooledSemanticChunker(SemanticChunker):
+    """SemanticChunker that also returns a vector for each chunk.
+
+    Chunks are whatever SemanticChunker.split_text returns; the sentence embeddings
+    it computes along the way (each sentence with buffer_size neighbours) are
+    recorded. Each chunk's vector is the mean of its sentences' embeddings, rescaled
+    to their average norm, so the chunks do not have to be sent through the model a
+    second time.
+    """
+
+    def __init__(self, embeddings, **kwargs):
+        super().__init__(_RecordingEmbeddings(embeddings), **kwargs)
+
+    def split_text_with_vectors(self, text):
+        """Return [(chunk_text, vector)]; vector is None when the chunk's sentence embeddings are not known"""
+        self.embeddings.vectors = None
+        chunks = self.split_text(text)
+        vectors = self.embeddings.vectors
+        sentences = re.split(self.sentence_split_regex, text)
+        if vectors is None or len(vectors) != len(sentences):
+            return [(chunk, None) for chunk in chunks]
+
+        # Each chunk is a run of consecutive sentences joined by single spaces
+        pooled = []
+        start = 0
+        for chunk in chunks:
+            end = start
+            length = -1
+            while end < len(sentences) and length < len(chunk):
+                length += 1 + len(sentences[end])
+                end += 1
+            if ' '.join(sentences[start:end]) != chunk:
+                # Not split the way this class expects; the index embeds the remaining chunks
+                pooled.extend((rest, None) for rest in chunks[len(pooled):])
+                break
+            pooled.append((chunk, self._pool(vectors[start:end])))
+            start = end
+        return pooled
+
+    @staticmethod
+    def _pool(vectors):
+        vectors = np.asarray(vectors, dtype='float32')
+        pooled = vectors.mean(axis=0)
+        norm = np.linalg.norm(pooled)
+        if norm > 0:
+            pooled *= np.linalg.norm(vectors, axis=1).mean() / norm
+        return pooled.tolist()
+
+
+class Chunker:
+    """Splits page documents into chunks with the configured CHUNKING_MODE.
+
+    split() returns (chunks, vectors). vectors is None when the index should embed
+    the chunks itself; in semantic_pooled mode it holds one vector per chunk.
+    """
+
+    def __init__(self, embedder, mode=CHUNKING_MODE, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+        if mode not in CHUNKING_MODES:
+            raise ValueError(f"Unknown chunking mode {mode!r}; expected one of {', '.join(CHUNKING_MODES)}")
+        self.embedder = embedder
+        self.mode = mode
+        if mode == 'recursive':
+            self._splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        elif mode == 'semantic_pooled':
+            self._splitter = PooledSemanticChunker(embedder)
+        else:
+            self._splitter = SemanticChunker(embedder)
+
+    def split(self, docs):
+        if self.mode != 'semantic_pooled':
+            return self._splitter.split_documents(docs), None
+
+        chunks = []
+        vectors = []
+        for doc in docs:
+            for text, vector in self._splitter.split_text_with_vectors(doc.page_content):
+                chunks.append(Document(page_content=text, metadata=copy.deepcopy(doc.metadata)))
+                vectors.append(vector)
+
+        # Texts too short to split were never embedded
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            for i, vector in zip(missing, self.embedder.embed_documents([chunks[i].page_content for i in missing])):
+                vectors[i] = vector
+        return chunks, vectors
@@ -0,0 +1,147 @@
+import os
+import re
+import math
+import threading
+from collections import OrderedDict, deque
+
+# Configuration
+CONTEXT_TOKEN_BUDGET = int(os.environ.get('CONTEXT_TOKEN_BUDGET', 3000))  # Document context + history
+HISTORY_TOKEN_SHARE = float(os.environ.get('HISTORY_TOKEN_SHARE', 0.25))  # Most of the budget history may take
+HISTORY_WINDOW_TURNS = int(os.environ.get('HISTORY_WINDOW_TURNS', 5))
+HISTORY_WINDOW_MAX_USERS = int(os.environ.get('HISTORY_WINDOW_MAX_USERS', 10000))
+CHARS_PER_TOKEN = 4  # Rough average for English text; the model's tokenizer is not available in-process
+
+_THINK_BLOCK = re.compile(r'<think>.*?(</think>|$)', re.DOTALL | re.IGNORECASE)
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def strip_reasoning(text):
+    """Remove <think>...</think> reasoning traces (also unterminated ones) from a model answer"""
+    if not text:
+        return text
+    return _THINK_BLOCK.sub('', text).strip()
+
+
+def dedupe_chunks(chunks):
+    """Drop chunks whose whitespace-normalized text was already seen, keeping rank order"""
+    seen = set()
+    unique = []
+    for chunk in chunks:
+        key = ' '.join(chunk.split())
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(chunk)
+    return unique
+
+
+def _truncate(text, tokens):
+    return text[:tokens * CHARS_PER_TOKEN]
+
+
+def pack_context(chunks, turns, budget=CONTEXT_TOKEN_BUDGET, history_share=HISTORY_TOKEN_SHARE):
+    """Fit retrieved chunks and conversation turns into a token budget.
+
+    chunks are in relevance order and turns are (user_message, bot_message) pairs,
+    oldest first. History gets at most history_share of the budget, newest turns
+    first; chunks take the rest in rank order, skipping those that no longer fit.
+    The best chunk is truncated rather than dropped when it alone exceeds the budget.
+    Returns (chunks, turns, tokens) of what was kept.
+    """
+    history_budget = int(budget * history_share)
+    kept_turns = []
+    history_tokens = 0
+    for user_message, bot_message in reversed(turns):
+        cost = estimate_tokens(user_message) + estimate_tokens(bot_message)
+        if history_tokens + cost > history_budget:
+            break
+        kept_turns.append((user_message, bot_message))
+        history_tokens += cost
+    kept_turns.reverse()
+
+    chunk_budget = budget - history_tokens
+    kept_chunks = []
+    chunk_tokens = 0
+    for chunk in chunks:
+        cost = estimate_tokens(chunk)
+        if chunk_tokens + cost <= chunk_budget:
+            kept_chunks.append(chunk)
+            chunk_tokens += cost
+    if chunks and not kept_chunks:
+        kept_chunks = [_truncate(chunks[0], chunk_budget)]
+        chunk_tokens = estimate_tokens(kept_chunks[0])
+
+    return kept_chunks, kept_turns, history_tokens + chunk_tokens
+
+
+def format_history(turns):
+    conversation = []
+    for user_message, bot_message in turns:
+        conversation.append(f"Human: {user_message}")
+        if bot_message:
+            conversation.append(f"Assistant: {bot_message}")
+    return "\n".join(conversation)
+
+
+class HistoryWindow:
+    """The last few (user_message, bot_message) turns per user, kept in memory.
+
+    Writes append to a user's window if it is loaded; a miss loads it once through
+    load_fn(user_id, limit), which returns turns oldest first. Answers are stored
+    without reasoning traces. Least recently used windows are dropped beyond max_users.
+    """
+
+    def __init__(self, load_fn, turns=HISTORY_WINDOW_TURNS, max_users=HISTORY_WINDOW_MAX_USERS):
+        self.load_fn = load_fn
+        self.turns = turns
+        self.max_users = max_users
+        self._windows = OrderedDict()
+        self._loading = {}  # Users being loaded: {user_id: written_to_since_load_started}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        with self._lock:
+            window = self._windows.get(user_id)
+            if window is not None:
+                self._windows.move_to_end(user_id)
+                self.hits += 1
+                return list(window)
+            self.misses += 1
+            self._loading[user_id] = False
+
+        try:
+            turns = [(user_message, strip_reasoning(bot_message))
+                     for user_message, bot_message in self.load_fn(user_id, self.turns)]
+        except Exception:
+            with self._lock:
+                self._loading.pop(user_id, None)
+            raise
+        with self._lock:
+            # A write during the load may be missing from what was read, so only cache clean loads
+            if not self._loading.pop(user_id, True) and user_id not in self._windows:
+                self._windows[user_id] = deque(turns, maxlen=self.turns)
+                while len(self._windows) > self.max_users:
+                    self._windows.popitem(last=False)
+        return turns
+
+    def append(self, user_id, user_message, bot_message):
+        with self._lock:
+            if user_id in self._loading:
+                self._loading[user_id] = True
+            window = self._windows.get(user_id)
+            if window is not None:
+                window.append((user_message, strip_reasoning(bot_message)))
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if user_id in self._loading:
+                self._loading[user_id] = True
+            self._windows.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'users': len(self._windows), 'hits': self.hits, 'misses': self.misses}
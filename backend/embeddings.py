@@ -0,0 +1,317 @@
+import os
+import json
+import sqlite3
+import hashlib
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from queue import PriorityQueue, Empty
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Configuration
+EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL', 'sentence-transformers/all-mpnet-base-v2')
+EMBEDDING_MAX_BATCH_SIZE = int(os.environ.get('EMBEDDING_MAX_BATCH_SIZE', 64))
+EMBEDDING_MAX_WAIT_MS = float(os.environ.get('EMBEDDING_MAX_WAIT_MS', 5))
+EMBEDDING_CACHE_PATH = os.environ.get('EMBEDDING_CACHE_PATH')
+
+# 'torch' runs EMBEDDING_MODEL with sentence-transformers; 'onnx' runs a model exported by export_onnx_embeddings.py
+EMBEDDING_BACKEND = os.environ.get('EMBEDDING_BACKEND', 'torch')
+ONNX_MODEL_DIR = os.environ.get('ONNX_MODEL_DIR', 'onnx_model')
+ONNX_MODEL_FILE = os.environ.get('ONNX_MODEL_FILE', 'model.onnx')  # model_int8.onnx for the quantized export
+ONNX_INTRA_OP_THREADS = int(os.environ.get('ONNX_INTRA_OP_THREADS', 0))  # 0 lets onnxruntime pick
+ONNX_BATCH_SIZE = int(os.environ.get('ONNX_BATCH_SIZE', 32))
+
+
+def _load_huggingface_model():
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        encode_kwargs={'batch_size': EMBEDDING_MAX_BATCH_SIZE}
+    )
+
+
+def _load_onnx_model():
+    return OnnxEmbeddings(ONNX_MODEL_DIR, ONNX_MODEL_FILE)
+
+
+def _load_embedding_model():
+    if EMBEDDING_BACKEND == 'onnx':
+        return _load_onnx_model()
+    if EMBEDDING_BACKEND != 'torch':
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {EMBEDDING_BACKEND!r}; expected 'torch' or 'onnx'")
+    return _load_huggingface_model()
+
+
+def embedding_model_id():
+    """Identifies the vectors the configured backend produces, for the embedding cache"""
+    if EMBEDDING_BACKEND == 'onnx':
+        return f"onnx:{os.path.abspath(os.path.join(ONNX_MODEL_DIR, ONNX_MODEL_FILE))}"
+    return EMBEDDING_MODEL
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence embeddings from an exported transformer run with onnxruntime on CPU.
+
+    model_dir holds the ONNX model files, tokenizer.json and pooling.json written by
+    export_onnx_embeddings.py. Texts are tokenized with the fast tokenizer, sorted by
+    length so each batch pads little, and pooled and normalized the way the original
+    sentence-transformers model does.
+    """
+
+    def __init__(self, model_dir, model_file='model.onnx', intra_op_threads=ONNX_INTRA_OP_THREADS,
+                 batch_size=ONNX_BATCH_SIZE):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, 'pooling.json')) as f:
+            self.config = json.load(f)
+        self.batch_size = max(1, batch_size)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=['CPUExecutionProvider'])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length=self.config['max_length'])
+        self.tokenizer.enable_padding(pad_id=self.config['pad_token_id'], pad_token=self.config['pad_token'])
+
+    def _encode(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            'input_ids': np.array([e.ids for e in encodings], dtype=np.int64),
+            'attention_mask': np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            'token_type_ids': np.array([e.type_ids for e in encodings], dtype=np.int64)
+        }
+        hidden = self.session.run(None, {name: inputs[name] for name in self.input_names})[0]
+
+        if self.config['pooling'] == 'cls':
+            vectors = hidden[:, 0]
+        else:
+            mask = inputs['attention_mask'][:, :, None].astype(np.float32)
+            vectors = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.config['normalize']:
+            vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._encode([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text):
+        return self._encode([text])[0].tolist()
+
+
+class BatchedEmbeddings(Embeddings):
+    """Shares one embedding model per process and groups concurrent calls into micro-batches.
+
+    Callers enqueue their texts and block on a future; a single worker thread owns the
+    model, so encoding never runs concurrently. Queries are queued ahead of document
+    slices, so a chat query waits for at most the batch being encoded rather than
+    behind a whole file being ingested.
+    """
+
+    QUERY = 0
+    DOCUMENT = 1
+
+    def __init__(self, model_factory, max_batch_size=EMBEDDING_MAX_BATCH_SIZE, max_wait_ms=EMBEDDING_MAX_WAIT_MS):
+        self.model_factory = model_factory
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._queue = PriorityQueue()  # (priority, sequence, texts, future)
+        self._sequence = itertools.count()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self.model_factory()
+        return self._model
+
+    def embed_documents(self, texts):
+        return self._embed(texts, self.DOCUMENT)
+
+    def embed_query(self, text):
+        return self._embed([text], self.QUERY)[0]
+
+    def embed_queries(self, texts):
+        """Embed several queries in one call"""
+        return self._embed(texts, self.QUERY)
+
+    def _embed(self, texts, priority):
+        texts = list(texts)
+        if not texts:
+            return []
+
+        self._ensure_worker()
+
+        # Split large requests so short query embeddings can be batched in between
+        futures = []
+        for start in range(0, len(texts), self.max_batch_size):
+            future = Future()
+            self._queue.put((priority, next(self._sequence), texts[start:start + self.max_batch_size], future))
+            futures.append(future)
+
+        vectors = []
+        for future in futures:
+            vectors.extend(future.result())
+        return vectors
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+                self._worker.start()
+
+    def _collect_batch(self):
+        """Texts and futures of the next batch, queries first"""
+        _, _, texts, future = self._queue.get()
+        batch = [(texts, future)]
+        size = len(texts)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except Empty:
+                break
+            if size + len(item[2]) > self.max_batch_size:
+                # Left for the next batch, keeping its place in the queue
+                self._queue.put(item)
+                break
+            batch.append((item[2], item[3]))
+            size += len(item[2])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                flat_texts = [text for texts, _ in batch for text in texts]
+                vectors = self.model.embed_documents(flat_texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for texts, future in batch:
+                future.set_result(vectors[offset:offset + len(texts)])
+                offset += len(texts)
+
+
+class EmbeddingCache:
+    """Persistent store of document embeddings keyed by model name and chunk-text hash"""
+
+    def __init__(self, path, model_name=None):
+        self.path = path
+        self.model_name = model_name or embedding_model_id()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)')
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, items):
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+        with self._lock:
+            self._conn.executemany('INSERT OR IGNORE INTO embeddings (key, vector) VALUES (?, ?)', rows)
+            self._conn.commit()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeds only document texts that are not already in the embedding cache"""
+
+    def __init__(self, embedder, cache):
+        self.embedder = embedder
+        self.cache = cache
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        keys = [self.cache.key(text) for text in texts]
+        found = self.cache.get_many(list(set(keys)))
+
+        # Embed each distinct missing text once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.embedder.embed_documents(list(missing.values()))
+            new_items = list(zip(missing.keys(), vectors))
+            self.cache.put_many(new_items)
+            found.update(new_items)
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text):
+        return self.embedder.embed_query(text)
+
+    def embed_queries(self, texts):
+        """Embed several queries in one call; like embed_query, they are not cached"""
+        return self.embedder.embed_queries(texts)
+
+
+_embedder = None
+_model_embedder = None
+_embedder_lock = threading.Lock()
+_embedding_cache_path = EMBEDDING_CACHE_PATH
+
+def configure_embedding_cache(path):
+    """Set where document embeddings are cached; must be called before get_embedder"""
+    global _embedding_cache_path
+    _embedding_cache_path = path
+
+def get_embedder(cached=True):
+    """Return the process-wide embedding service, creating it on first use.
+
+    cached=False skips the embedding cache; use it for intermediate texts such as the
+    sentence windows SemanticChunker embeds, which would only bloat the cache.
+    """
+    global _embedder, _model_embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                _model_embedder = BatchedEmbeddings(_load_embedding_model)
+                embedder = _model_embedder
+                if _embedding_cache_path:
+                    embedder = CachedEmbeddings(embedder, EmbeddingCache(_embedding_cache_path))
+                _embedder = embedder
+    return _embedder if cached else _model_embedder
@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import inspect
+import argparse
+
+from embeddings import EMBEDDING_MODEL, ONNX_MODEL_DIR
+
+INPUT_NAMES = ('input_ids', 'attention_mask', 'token_type_ids')
+
+
+def export(model_name, output_dir, opset=14, quantize=True):
+    """Export a sentence-transformers model's transformer to ONNX, with an optional int8 copy.
+
+    Writes model.onnx (and model_int8.onnx), tokenizer.json and pooling.json, which
+    hold everything OnnxEmbeddings needs to reproduce the model's vectors.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    model = SentenceTransformer(model_name, device='cpu')
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    pooling = next(module for module in model if isinstance(module, Pooling))
+    if pooling.pooling_mode_cls_token:
+        pooling_mode = 'cls'
+    elif pooling.pooling_mode_mean_tokens:
+        pooling_mode = 'mean'
+    else:
+        raise ValueError(f"{model_name} uses a pooling mode OnnxEmbeddings does not support")
+
+    sample = tokenizer(['An example sentence to trace the model with.'], return_tensors='pt')
+    input_names = [name for name in INPUT_NAMES if name in sample]
+
+    class Encoder(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, *inputs):
+            return self.transformer(**dict(zip(input_names, inputs))).last_hidden_state
+
+    # Newer torch defaults to the torch.export based exporter, which does not take dynamic_axes
+    exporter = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+
+    os.makedirs(output_dir, exist_ok=True)
+    model_path = os.path.join(output_dir, 'model.onnx')
+    with torch.no_grad():
+        torch.onnx.export(
+            Encoder(), tuple(sample[name] for name in input_names), model_path,
+            input_names=input_names, output_names=['last_hidden_state'],
+            dynamic_axes={**{name: {0: 'batch', 1: 'sequence'} for name in input_names},
+                          'last_hidden_state': {0: 'batch', 1: 'sequence'}},
+            opset_version=opset,
+            **exporter
+        )
+
+    paths = [model_path]
+    if quantize:
+        # Dynamic quantization: int8 weights, activations quantized on the fly; no calibration data needed
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantized_path = os.path.join(output_dir, 'model_int8.onnx')
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        paths.append(quantized_path)
+
+    tokenizer.backend_tokenizer.save(os.path.join(output_dir, 'tokenizer.json'))
+    with open(os.path.join(output_dir, 'pooling.json'), 'w') as f:
+        json.dump({
+            'model': model_name,
+            'pooling': pooling_mode,
+            'normalize': any(isinstance(module, Normalize) for module in model),
+            'max_length': model.max_seq_length,
+            'pad_token': tokenizer.pad_token,
+            'pad_token_id': tokenizer.pad_token_id
+        }, f, indent=2)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export the embedding model to ONNX for EMBEDDING_BACKEND=onnx')
+    parser.add_argument('--model', default=EMBEDDING_MODEL)
+    parser.add_argument('--output-dir', default=ONNX_MODEL_DIR)
+    parser.add_argument('--opset', type=int, default=14)
+    parser.add_argument('--no-quantize', action='store_true', help='Skip writing the int8 model')
+    args = parser.parse_args(argv)
+
+    for path in export(args.model, args.output_dir, args.opset, quantize=not args.no_quantize):
+        print(f"Wrote {path} ({os.path.getsize(path) / 2 ** 20:.1f} MB)")
+    print('Check the vectors against the original model with: python bench_embeddings.py --parity')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
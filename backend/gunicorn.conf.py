@@ -0,0 +1,16 @@
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Threaded workers: while one thread waits on bcrypt, Ollama or the database,
+# the others keep serving. Vector indexes are memory-mapped and shared between
+# workers, but job status and the answer and history caches live in process
+# memory, so scale with threads before adding workers.
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+
+# Streaming chat responses and long uploads can outlive the default 30 s
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 300))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
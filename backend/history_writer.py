@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+
+from sqlalchemy import insert
+
+from models import db, ChatHistory
+from metrics import registry
+
+# Configuration
+HISTORY_WRITE_BEHIND = os.environ.get('HISTORY_WRITE_BEHIND', 'false').lower() == 'true'
+HISTORY_FLUSH_BATCH_SIZE = int(os.environ.get('HISTORY_FLUSH_BATCH_SIZE', 100))
+HISTORY_FLUSH_INTERVAL_MS = float(os.environ.get('HISTORY_FLUSH_INTERVAL_MS', 200))
+HISTORY_MAX_PENDING = int(os.environ.get('HISTORY_MAX_PENDING', 10000))
+
+_COLUMNS = ('id', 'user_id', 'user_message', 'bot_message', 'sources', 'timestamp')
+
+
+class HistoryWriter:
+    """Write-behind buffer for ChatHistory rows.
+
+    Entries arrive with their id and timestamp already set, so callers can answer
+    immediately. A background thread inserts them in batches once batch_size entries
+    are waiting or the oldest has waited flush_interval_ms. Entries stay visible
+    through pending_for() until their batch is committed. When max_pending is reached
+    the caller flushes inline, which slows chat down instead of dropping history.
+    """
+
+    def __init__(self, app, batch_size=HISTORY_FLUSH_BATCH_SIZE, flush_interval_ms=HISTORY_FLUSH_INTERVAL_MS,
+                 max_pending=HISTORY_MAX_PENDING):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending
+        self._pending = []    # Entries waiting for the next batch
+        self._in_flight = []  # Entries of the batch being inserted
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()  # One batch insert at a time
+        self._closed = False
+        self._flushed = 0
+        self._batches = 0
+        self._failures = 0
+        self._worker = threading.Thread(target=self._loop, name='history-writer', daemon=True)
+        self._worker.start()
+        registry.add_collector(self._collect_metrics)
+
+    def add(self, entry):
+        """Queue a transient ChatHistory entry for insertion"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('History writer is closed')
+            self._pending.append(entry)
+            if self._oldest is None:
+                # Start the flush timer of the worker
+                self._oldest = time.monotonic()
+                self._wakeup.notify()
+            elif len(self._pending) >= self.batch_size:
+                self._wakeup.notify()
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self.flush()
+
+    def pending_for(self, user_id):
+        """Entries of user_id not yet committed, oldest first"""
+        with self._lock:
+            return [entry for entry in self._in_flight + self._pending if entry.user_id == user_id]
+
+    def discard_user(self, user_id):
+        """Drop queued entries of user_id, e.g. when the user clears their history"""
+        with self._lock:
+            self._pending = [entry for entry in self._pending if entry.user_id != user_id]
+        # An in-flight batch may still land, so wait for it before the caller deletes
+        with self._flush_lock:
+            pass
+
+    def flush(self):
+        """Insert everything queued so far; returns the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending, self._oldest = self._pending, [], None
+                self._in_flight = batch
+            try:
+                if batch:
+                    self._insert(batch)
+                return len(batch)
+            finally:
+                with self._lock:
+                    self._in_flight = []
+
+    def _insert(self, batch):
+        rows = [{column: getattr(entry, column) for column in _COLUMNS} for entry in batch]
+        with self.app.app_context():
+            try:
+                db.session.execute(insert(ChatHistory), rows)
+                db.session.commit()
+                self._record(len(rows), 1, 0)
+                return
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.warning(f"Batched history insert of {len(rows)} rows failed, retrying row by row: {e}")
+
+            # Isolate the rows that cannot be written (e.g. their user was deleted) from the rest
+            written = failed = 0
+            for row in rows:
+                try:
+                    db.session.execute(insert(ChatHistory), [row])
+                    db.session.commit()
+                    written += 1
+                except Exception as e:
+                    db.session.rollback()
+                    failed += 1
+                    self.app.logger.error(f"Dropping chat history entry {row['id']}: {e}")
+            self._record(written, 0, failed)
+
+    def _record(self, flushed, batches, failures):
+        with self._lock:
+            self._flushed += flushed
+            self._batches += batches
+            self._failures += failures
+
+    def _loop(self):
+        while True:
+            with self._lock:
+                while not self._closed and not self._due():
+                    timeout = None if self._oldest is None else self._oldest + self.flush_interval - time.monotonic()
+                    self._wakeup.wait(timeout)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                self.app.logger.error(f"History flush failed: {e}")
+
+    def _due(self):
+        if not self._pending:
+            return False
+        return len(self._pending) >= self.batch_size or time.monotonic() - self._oldest >= self.flush_interval
+
+    def close(self):
+        """Stop the background thread and write out whatever is still queued"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        self._worker.join(timeout=10)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': len(self._pending) + len(self._in_flight),
+                'flushed': self._flushed,
+                'batches': self._batches,
+                'failures': self._failures
+            }
+
+    def _collect_metrics(self):
+        stats = self.stats()
+        return [
+            ('proxima_history_pending', 'gauge', 'Chat history entries waiting to be written', [({}, stats['pending'])]),
+            ('proxima_history_flushed_total', 'counter', 'Chat history entries written in batches', [({}, stats['flushed'])]),
+            ('proxima_history_batches_total', 'counter', 'Batched chat history inserts', [({}, stats['batches'])]),
+            ('proxima_history_failures_total', 'counter', 'Chat history entries that could not be written', [({}, stats['failures'])])
+        ]
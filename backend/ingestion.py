@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import registry, timed, begin_timings, end_timings
+
+# Configuration
+INGESTION_WORKERS = int(os.environ.get('INGESTION_WORKERS', 2))
+INGESTION_MAX_PENDING = int(os.environ.get('INGESTION_MAX_PENDING', 100))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class IngestionQueueFull(Exception):
+    pass
+
+
+class IngestionJob:
+    """Status and progress of one background processing run for a user"""
+
+    def __init__(self, user_id, remove=None):
+        self.id = str(uuid.uuid4())
+        self.user_id = user_id
+        self.remove = remove  # File ids to drop from the index; None processes all of the user's files
+        self.status = QUEUED
+        self.message = None
+        self.files_total = 0
+        self.files_done = 0
+        self.pages_total = 0
+        self.pages_done = 0
+        self.chunks = 0
+        self.chunking_mode = None
+        self.pages_per_second = None  # Chunking and embedding throughput
+        self.failed_files = []
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def update(self, **progress):
+        with self._lock:
+            for key, value in progress.items():
+                setattr(self, key, value)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'id': self.id,
+                'status': self.status,
+                'message': self.message,
+                'progress': {
+                    'files_total': self.files_total,
+                    'files_done': self.files_done,
+                    'pages_total': self.pages_total,
+                    'pages_done': self.pages_done,
+                    'chunks': self.chunks,
+                    'chunking_mode': self.chunking_mode,
+                    'pages_per_second': self.pages_per_second
+                },
+                'failed_files': self.failed_files,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at
+            }
+
+
+class IngestionQueue:
+    """Runs process_fn(user_id, progress=..., remove=...) on a bounded worker pool.
+
+    At most one job per user runs at a time. A request that arrives while the
+    user's job is still queued joins that job; one that arrives while it is running
+    schedules a single follow-up, so files uploaded mid-run are not missed. Jobs
+    submitted with remove only drop those files from the index; a full run joined
+    by one drops deleted files anyway.
+    """
+
+    def __init__(self, app, process_fn, max_workers=INGESTION_WORKERS, max_pending=INGESTION_MAX_PENDING):
+        self.app = app
+        self.process_fn = process_fn
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ingestion')
+        self.jobs = {}  # Latest job per user: {user_id: IngestionJob}
+        self._followups = {}  # Jobs waiting for the user's running job: {user_id: IngestionJob}
+        self._lock = threading.Lock()
+        registry.add_collector(self._collect_metrics)
+
+    def _collect_metrics(self):
+        with self._lock:
+            statuses = [job.status for job in self.jobs.values()]
+        return [('proxima_ingestion_jobs', 'gauge', 'Latest ingestion job per user by status',
+                 [({'status': status}, statuses.count(status)) for status in (QUEUED, RUNNING, DONE, FAILED)])]
+
+    def submit(self, user_id, remove=None):
+        """Queue a processing run for user_id, or only the removal of the file ids in remove; returns (job, created)"""
+        with self._lock:
+            job = self.jobs.get(user_id)
+            if job is not None and job.status == QUEUED:
+                if job.remove is not None:
+                    job.update(remove=None if remove is None else job.remove | set(remove))
+                return job, False
+
+            pending = sum(1 for j in self.jobs.values() if j.status == QUEUED)
+            if pending >= self.max_pending:
+                raise IngestionQueueFull('Too many processing jobs queued, try again later')
+
+            new_job = IngestionJob(user_id, None if remove is None else set(remove))
+            self.jobs[user_id] = new_job
+            if job is not None and job.status == RUNNING:
+                self._followups[user_id] = new_job
+            else:
+                self.executor.submit(self._run, new_job)
+            return new_job, True
+
+    def get(self, user_id):
+        return self.jobs.get(user_id)
+
+    def _run(self, job):
+        job.update(status=RUNNING, started_at=time.time())
+        begin_timings('ingestion')
+        try:
+            with self.app.app_context(), timed('job'):
+                result = self.process_fn(job.user_id, progress=job.update, remove=job.remove)
+            job.update(
+                status=DONE if result.get('success') else FAILED,
+                message=result.get('message')
+            )
+        except Exception as e:
+            job.update(status=FAILED, message=f"Error processing files: {str(e)}")
+        finally:
+            end_timings()
+            job.update(finished_at=time.time())
+            with self._lock:
+                followup = self._followups.pop(job.user_id, None)
+                if followup is not None:
+                    self.executor.submit(self._run, followup)
@@ -0,0 +1,194 @@
+import os
+import re
+import math
+from collections import Counter
+
+import numpy as np
+
+# Configuration
+BM25_K1 = float(os.environ.get('BM25_K1', 1.2))
+BM25_B = float(os.environ.get('BM25_B', 0.75))
+
+# Words, plus compound tokens such as 4.2.1, INV-2024-001 or a/b that are also indexed by their parts
+_TOKEN = re.compile(r'\w+(?:[.\-/]\w+)*')
+_SEPARATOR = re.compile(r'[.\-/_]')
+_STOPWORDS = frozenset(
+    'a an and are as at be but by did do does for from has have how i in is it its of on or so than that the '
+    'their them then there these they this to was were what when where which who why will with you your'.split()
+)
+
+
+def tokenize(text):
+    tokens = []
+    for match in _TOKEN.finditer(text.lower()):
+        token = match.group()
+        if token not in _STOPWORDS:
+            tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in _SEPARATOR.split(token) if part and part not in _STOPWORDS)
+    return tokens
+
+
+class Segment:
+    """Inverted index of one file's chunks in CSR form.
+
+    Term i's postings are docs[offsets[i]:offsets[i + 1]] (chunk numbers within the
+    file) with their term frequencies in tfs; lengths holds each chunk's token count.
+    """
+
+    def __init__(self, terms, offsets, docs, tfs, lengths):
+        self.terms = terms  # {term: row}
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.lengths = lengths
+
+    @classmethod
+    def build(cls, texts):
+        postings = {}
+        lengths = np.zeros(len(texts), dtype=np.uint32)
+        for doc, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths[doc] = sum(counts.values())
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc, tf))
+
+        vocabulary = sorted(postings)
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.uint32)
+        docs = []
+        tfs = []
+        for row, term in enumerate(vocabulary):
+            for doc, tf in postings[term]:
+                docs.append(doc)
+                tfs.append(min(tf, 65535))
+            offsets[row + 1] = len(docs)
+        return cls({term: row for row, term in enumerate(vocabulary)}, offsets,
+                   np.array(docs, dtype=np.uint32), np.array(tfs, dtype=np.uint16), lengths)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            vocabulary = data['vocabulary'].tobytes().decode('utf-8').split('\n') if data['vocabulary'].size else []
+            return cls({term: row for row, term in enumerate(vocabulary)},
+                       data['offsets'], data['docs'], data['tfs'], data['lengths'])
+
+    def save(self, path):
+        vocabulary = '\n'.join(sorted(self.terms, key=self.terms.get)).encode('utf-8')
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(tmp_path, vocabulary=np.frombuffer(vocabulary, dtype=np.uint8),
+                            offsets=self.offsets, docs=self.docs, tfs=self.tfs, lengths=self.lengths)
+        os.replace(tmp_path, path)
+
+    def df(self, term):
+        row = self.terms.get(term)
+        return 0 if row is None else int(self.offsets[row + 1] - self.offsets[row])
+
+    def postings(self, term):
+        row = self.terms.get(term)
+        if row is None:
+            return None, None
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return self.docs[start:end], self.tfs[start:end]
+
+    @property
+    def nbytes(self):
+        # Arrays plus a rough figure for the term dictionary
+        return (self.offsets.nbytes + self.docs.nbytes + self.tfs.nbytes + self.lengths.nbytes
+                + sum(len(term) + 80 for term in self.terms))
+
+
+class LexicalIndex:
+    """Per-user BM25 index kept next to the FAISS index, one segment per file.
+
+    Adding or removing a file touches only that file's segment, on disk and in
+    memory; corpus statistics (document count, average length, document frequency)
+    are summed over the segments at query time. Hits are (file_id, chunk_number),
+    matching the ``<file_id>:<n>`` chunk ids of UserIndex.
+    """
+
+    def __init__(self, folder, k1=BM25_K1, b=BM25_B):
+        self.folder = folder
+        self.k1 = k1
+        self.b = b
+        self.segments = {}  # {file_id: Segment}
+        self._added = set()
+        self._removed = set()
+
+    def _path(self, file_id):
+        return os.path.join(self.folder, f"{file_id}.npz")
+
+    def load(self, file_ids):
+        """Read the segments of file_ids; files indexed before the lexical index existed are skipped"""
+        for file_id in file_ids:
+            try:
+                self.segments[file_id] = Segment.load(self._path(file_id))
+            except FileNotFoundError:
+                continue
+        return self
+
+    def has(self, file_id):
+        return file_id in self.segments or (file_id not in self._removed and os.path.exists(self._path(file_id)))
+
+    def add(self, file_id, texts):
+        self.segments[file_id] = Segment.build(texts)
+        self._added.add(file_id)
+        self._removed.discard(file_id)
+
+    def remove(self, file_id):
+        self.segments.pop(file_id, None)
+        self._added.discard(file_id)
+        self._removed.add(file_id)
+
+    def save(self):
+        """Write segments added since the last save and delete removed ones"""
+        os.makedirs(self.folder, exist_ok=True)
+        for file_id in self._added:
+            self.segments[file_id].save(self._path(file_id))
+        for file_id in self._removed:
+            if os.path.exists(self._path(file_id)):
+                os.remove(self._path(file_id))
+        self._added.clear()
+        self._removed.clear()
+
+    @property
+    def is_empty(self):
+        return not self.segments
+
+    @property
+    def nbytes(self):
+        return sum(segment.nbytes for segment in self.segments.values())
+
+    def search(self, query, k, file_ids=None):
+        """Top-k (file_id, chunk_number, score) by BM25, optionally only within file_ids"""
+        terms = set(tokenize(query))
+        if not terms or not self.segments:
+            return []
+
+        segments = self.segments.items()
+        n_docs = sum(len(segment.lengths) for _, segment in segments)
+        avg_length = max(1.0, sum(float(segment.lengths.sum()) for _, segment in segments) / max(1, n_docs))
+        idf = {}
+        for term in terms:
+            df = sum(segment.df(term) for _, segment in segments)
+            if df:
+                idf[term] = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+        hits = []
+        for file_id, segment in segments:
+            if file_ids is not None and file_id not in file_ids:
+                continue
+            scores = np.zeros(len(segment.lengths), dtype=np.float32)
+            norm = self.k1 * (1 - self.b + self.b * segment.lengths / avg_length)
+            for term, weight in idf.items():
+                docs, tfs = segment.postings(term)
+                if docs is None:
+                    continue
+                tfs = tfs.astype(np.float32)
+                scores[docs] += weight * tfs * (self.k1 + 1) / (tfs + norm[docs])
+            matched = np.flatnonzero(scores)
+            if len(matched) > k:
+                matched = matched[np.argpartition(-scores[matched], k)[:k]]
+            hits.extend((file_id, int(doc), float(scores[doc])) for doc in matched)
+
+        hits.sort(key=lambda hit: -hit[2])
+        return hits[:k]
@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+# Configuration
+LLM_BACKEND = os.environ.get('LLM_BACKEND', 'ollama')
+OLLAMA_MODEL = os.environ.get('OLLAMA_MODEL', 'deepseek-r1:1.5b')
+OLLAMA_BASE_URL = os.environ.get('OLLAMA_BASE_URL', 'http://localhost:11434')
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get('OLLAMA_CONNECT_TIMEOUT', 5))
+OLLAMA_READ_TIMEOUT = float(os.environ.get('OLLAMA_READ_TIMEOUT', 120))
+OLLAMA_POOL_SIZE = int(os.environ.get('OLLAMA_POOL_SIZE', 32))
+OLLAMA_KEEP_ALIVE = os.environ.get('OLLAMA_KEEP_ALIVE', '30m')  # How long the server keeps the model loaded
+STUB_LLM_TOKEN_DELAY_MS = float(os.environ.get('STUB_LLM_TOKEN_DELAY_MS', 0))
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def get_http_session(base_url):
+    """Return a keep-alive session with a connection pool for base_url"""
+    with _sessions_lock:
+        session = _sessions.get(base_url)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=OLLAMA_POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[base_url] = session
+        return session
+
+
+class OllamaClient(LLM):
+    """Ollama /api/generate client that reuses pooled HTTP connections"""
+
+    model: str = OLLAMA_MODEL
+    base_url: str = OLLAMA_BASE_URL
+    connect_timeout: float = OLLAMA_CONNECT_TIMEOUT
+    read_timeout: float = OLLAMA_READ_TIMEOUT
+    keep_alive: str = OLLAMA_KEEP_ALIVE
+
+    @property
+    def _llm_type(self):
+        return 'ollama-pooled'
+
+    def _post(self, prompt, stop, stream):
+        payload = {
+            'model': self.model,
+            'prompt': prompt,
+            'stream': stream,
+            'keep_alive': self.keep_alive
+        }
+        if stop:
+            payload['options'] = {'stop': stop}
+        response = get_http_session(self.base_url).post(
+            f"{self.base_url}/api/generate",
+            json=payload,
+            stream=stream,
+            timeout=(self.connect_timeout, self.read_timeout)
+        )
+        response.raise_for_status()
+        return response
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        return self._post(prompt, stop, stream=False).json().get('response', '')
+
+    def _stream(self, prompt, stop=None, run_manager=None, **kwargs):
+        response = self._post(prompt, stop, stream=True)
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get('response'):
+                    chunk = GenerationChunk(text=data['response'])
+                    if run_manager:
+                        run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                    yield chunk
+                if data.get('done'):
+                    break
+        finally:
+            # Returns the connection to the pool, or drops it if the stream was cut short
+            response.close()
+
+
+class StubLLM(LLM):
+    """Local stand-in for load and latency tests; answers from the prompt without a model server"""
+
+    token_delay_ms: float = STUB_LLM_TOKEN_DELAY_MS
+
+    @property
+    def _llm_type(self):
+        return 'stub'
+
+    def _tokens(self, prompt):
+        question = prompt.rsplit('Current Question:', 1)[-1].split('Answer:', 1)[0].strip()
+        answer = f"Stub answer to: {question or 'your question'}"
+        for word in answer.split(' '):
+            if self.token_delay_ms:
+                time.sleep(self.token_delay_ms / 1000.0)
+            yield word + ' '
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        return ''.join(self._tokens(prompt)).strip()
+
+    def _stream(self, prompt, stop=None, run_manager=None, **kwargs):
+        for token in self._tokens(prompt):
+            chunk = GenerationChunk(text=token)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+# LLM backends by name; register_llm_backend adds more
+_backends = {
+    'ollama': OllamaClient,
+    'stub': StubLLM
+}
+_clients = {}
+_clients_lock = threading.Lock()
+
+def register_llm_backend(name, factory):
+    with _clients_lock:
+        _backends[name] = factory
+        _clients.pop(name, None)
+
+def get_llm(backend=None):
+    """Return the shared client for a backend (LLM_BACKEND by default)"""
+    backend = backend or LLM_BACKEND
+    with _clients_lock:
+        client = _clients.get(backend)
+        if client is None:
+            if backend not in _backends:
+                raise ValueError(f"Unknown LLM backend: {backend}")
+            client = _backends[backend]()
+            _clients[backend] = client
+        return client
@@ -0,0 +1,204 @@
+import os
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from metrics import registry, LLM_QUEUE_WAIT
+
+# Configuration
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 4))  # Generations sent to the model at once
+LLM_MAX_QUEUE = int(os.environ.get('LLM_MAX_QUEUE', 64))
+LLM_MAX_QUEUED_PER_USER = int(os.environ.get('LLM_MAX_QUEUED_PER_USER', 8))
+LLM_QUEUE_TIMEOUT = float(os.environ.get('LLM_QUEUE_TIMEOUT', 20))  # Longest a request may wait for a slot, seconds
+
+
+class LLMSchedulerBusy(Exception):
+    """The model is saturated; retry_after is a hint in seconds"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.granted = False
+        self.event = threading.Event()
+
+
+class Lease:
+    """A generation slot; release() is idempotent"""
+
+    def __init__(self, scheduler):
+        self._scheduler = scheduler
+        self._started = time.monotonic()
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._scheduler._release(time.monotonic() - self._started)
+
+
+class LLMScheduler:
+    """Admission control in front of the LLM.
+
+    At most max_concurrency generations run at once. Others wait in per-user queues
+    that are served round-robin, so a user with many requests cannot starve the
+    rest. A request is rejected with LLMSchedulerBusy straight away when the queue
+    is full, the user already has max_queued_per_user waiting, or the expected wait
+    (from the average generation time) exceeds max_wait; also when it has waited
+    max_wait without getting a slot. Identical prompts in flight share one generation.
+    """
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, max_queue=LLM_MAX_QUEUE,
+                 max_queued_per_user=LLM_MAX_QUEUED_PER_USER, max_wait=LLM_QUEUE_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queued_per_user = max_queued_per_user
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._running = 0
+        self._queues = OrderedDict()  # {user_id: deque of waiting tickets}, in round-robin order
+        self._queued = 0
+        self._in_flight = {}  # {prompt_key: Future}
+        self._avg_generation = None  # Exponential moving average, seconds
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.coalesced = 0
+        registry.add_collector(self._collect_metrics)
+
+    def acquire(self, user_id):
+        """Wait for a generation slot and return its Lease"""
+        start = time.monotonic()
+        with self._lock:
+            if self._running < self.max_concurrency and not self._queued:
+                self._running += 1
+                self.admitted += 1
+                LLM_QUEUE_WAIT.observe(0)
+                return Lease(self)
+
+            queue = self._queues.get(user_id)
+            expected_wait = self._expected_wait(self._queued + 1)
+            if self._queued >= self.max_queue:
+                self.rejected += 1
+                raise LLMSchedulerBusy('The model is busy, try again shortly', self._retry_after(expected_wait))
+            if queue is not None and len(queue) >= self.max_queued_per_user:
+                self.rejected += 1
+                raise LLMSchedulerBusy('Too many requests waiting for the model', self._retry_after(expected_wait))
+            if expected_wait > self.max_wait:
+                self.rejected += 1
+                raise LLMSchedulerBusy('The model is busy, try again shortly', self._retry_after(expected_wait))
+
+            ticket = _Ticket(user_id)
+            self._queues.setdefault(user_id, deque()).append(ticket)
+            self._queued += 1
+
+        ticket.event.wait(self.max_wait)
+        with self._lock:
+            if not ticket.granted:
+                # Deadline passed while queued
+                queue = self._queues.get(user_id)
+                queue.remove(ticket)
+                if not queue:
+                    del self._queues[user_id]
+                self._queued -= 1
+                self.timed_out += 1
+                raise LLMSchedulerBusy('Timed out waiting for the model', self._retry_after(self._expected_wait(self._queued + 1)))
+            self.admitted += 1
+        LLM_QUEUE_WAIT.observe(time.monotonic() - start)
+        return Lease(self)
+
+    @contextmanager
+    def slot(self, user_id):
+        lease = self.acquire(user_id)
+        try:
+            yield lease
+        finally:
+            lease.release()
+
+    def run(self, user_id, prompt_key, fn):
+        """Return fn() run in a slot, or the result of an identical generation already in flight"""
+        with self._lock:
+            future = self._in_flight.get(prompt_key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[prompt_key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            with self.slot(user_id):
+                result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._in_flight.pop(prompt_key, None)
+
+    def _release(self, duration):
+        with self._lock:
+            self._running -= 1
+            if self._avg_generation is None:
+                self._avg_generation = duration
+            else:
+                self._avg_generation = 0.8 * self._avg_generation + 0.2 * duration
+            # Hand free slots to the next user in round-robin order
+            while self._running < self.max_concurrency and self._queued:
+                user_id, queue = next(iter(self._queues.items()))
+                ticket = queue.popleft()
+                if queue:
+                    self._queues.move_to_end(user_id)
+                else:
+                    del self._queues[user_id]
+                self._queued -= 1
+                self._running += 1
+                ticket.granted = True
+                ticket.event.set()
+
+    def _expected_wait(self, position):
+        if self._avg_generation is None:
+            return 0.0
+        return math.ceil(position / self.max_concurrency) * self._avg_generation
+
+    def _retry_after(self, expected_wait):
+        return max(1, math.ceil(min(expected_wait, self.max_wait)))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': self._running,
+                'queued': self._queued,
+                'queued_users': len(self._queues),
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'coalesced': self.coalesced,
+                'avg_generation_s': round(self._avg_generation, 3) if self._avg_generation is not None else None
+            }
+
+    def _collect_metrics(self):
+        stats = self.stats()
+        return [
+            ('proxima_llm_running', 'gauge', 'Generations running on the model', [({}, stats['running'])]),
+            ('proxima_llm_queue_depth', 'gauge', 'Generations waiting for a slot', [({}, stats['queued'])]),
+            ('proxima_llm_admitted_total', 'counter', 'Generations admitted to the model', [({}, stats['admitted'])]),
+            ('proxima_llm_rejected_total', 'counter', 'Generations rejected by admission control',
+             [({'reason': 'overload'}, stats['rejected']), ({'reason': 'timeout'}, stats['timed_out'])]),
+            ('proxima_llm_coalesced_total', 'counter', 'Requests served by an identical in-flight generation', [({}, stats['coalesced'])])
+        ]
@@ -1,29 +1,105 @@
+import time
+import uuid
+import random
+
 from locust import HttpUser, task, between
 
+from bench_seed import seed_pdfs, QUESTIONS
+
+SEED_PDFS = seed_pdfs()
+PROCESS_TIMEOUT = 120  # seconds
+
+
 class RAGUser(HttpUser):
+    """Registers its own account, uploads the seed PDFs and runs a weighted mix of API calls"""
+
     wait_time = between(1, 2)
 
     def on_start(self):
-        login_data = {
-            "email": "abc1@gmail.com",
-            "password": "1234"
-        }
-        with self.client.post("/api/auth/login", json=login_data, catch_response=True) as response:
+        self.email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+        self.password = 'bench-password'
+        self.token = None
+        self.ready = False
+
+        with self.client.post("/api/auth/register", json={"email": self.email, "password": self.password},
+                              catch_response=True) as response:
             if response.status_code == 200 and response.json().get("success"):
                 self.token = response.json()["token"]
             else:
-                response.failure("Failed to log in and get JWT token")
-                self.token = None
+                response.failure("Failed to register benchmark user")
+                return
+
+        for name, data in SEED_PDFS.items():
+            self.upload(name, data)
+        self.ready = self.process()
+
+    @property
+    def headers(self):
+        return {"Authorization": f"Bearer {self.token}"}
+
+    def upload(self, name, data):
+        with self.client.post("/api/upload", headers=self.headers, files={"file": (name, data, "application/pdf")},
+                              catch_response=True) as response:
+            if response.status_code != 200 or not response.json().get("success"):
+                response.failure(f"Upload failed: {response.text[:200]}")
+                return None
+            return response.json()["file"]["id"]
 
-    @task
+    def process(self):
+        """Start processing and poll until the job finishes"""
+        with self.client.post("/api/process", headers=self.headers, catch_response=True) as response:
+            if response.status_code not in (200, 202) or not response.json().get("success"):
+                response.failure(f"Process failed: {response.text[:200]}")
+                return False
+
+        deadline = time.time() + PROCESS_TIMEOUT
+        while time.time() < deadline:
+            response = self.client.get("/api/process/status", headers=self.headers)
+            if response.status_code == 200:
+                status = response.json()["job"]["status"]
+                if status == "done":
+                    return True
+                if status == "failed":
+                    return False
+            time.sleep(0.5)
+        return False
+
+    @task(10)
     def chat(self):
-        if not hasattr(self, "token") or not self.token:
-            return  # Skip if login failed
-        headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "message": "What is the summary of the uploaded document?"
-        }
-        self.client.post("/api/chat", json=data, headers=headers)
\ No newline at end of file
+        if not self.ready:
+            return
+        self.client.post("/api/chat", headers=self.headers, json={"message": random.choice(QUESTIONS)})
+
+    @task(3)
+    def list_history(self):
+        if self.token:
+            self.client.get("/api/history", headers=self.headers)
+
+    @task(2)
+    def login(self):
+        with self.client.post("/api/auth/login", json={"email": self.email, "password": self.password},
+                              catch_response=True) as response:
+            if response.status_code == 200 and response.json().get("success"):
+                self.token = response.json()["token"]
+            else:
+                response.failure("Failed to log in and get JWT token")
+
+    @task(1)
+    def upload_process_delete(self):
+        if not self.token:
+            return
+        name, data = random.choice(list(SEED_PDFS.items()))
+        file_id = self.upload(f"extra_{name}", data)
+        if file_id is None:
+            return
+        self.process()
+        self.client.delete(f"/api/files/{file_id}", headers=self.headers, name="/api/files/[id]")
+
+    @task(1)
+    def delete_history_item(self):
+        if not self.token:
+            return
+        response = self.client.get("/api/history", headers=self.headers)
+        if response.status_code == 200 and response.json().get("history"):
+            entry_id = response.json()["history"][-1]["id"]
+            self.client.delete(f"/api/history/{entry_id}", headers=self.headers, name="/api/history/[id]")
@@ -0,0 +1,189 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in pairs]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, state['counts']):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, ('le', bound))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, ('le', '+Inf'))} {state['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {state['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {state['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them in the Prometheus text exposition format.
+
+    Collectors are callables run at render time that return extra
+    (name, type, help, [(labels_dict, value)]) tuples, for stats kept elsewhere.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text, label_names=()):
+        return self._add(Counter(name, help_text, label_names))
+
+    def gauge(self, name, help_text, label_names=()):
+        return self._add(Gauge(name, help_text, label_names))
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, label_names, buckets))
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, metric_type, help_text, samples in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.histogram(
+    'proxima_request_latency_seconds', 'Request latency by endpoint', ('endpoint', 'status'))
+STAGE_LATENCY = registry.histogram(
+    'proxima_stage_latency_seconds', 'Latency of request stages', ('endpoint', 'stage'))
+IN_FLIGHT = registry.gauge(
+    'proxima_requests_in_flight', 'Requests currently being served', ('endpoint',))
+PROMPT_TOKENS = registry.histogram(
+    'proxima_prompt_tokens', 'Estimated prompt tokens of document context, history and question',
+    buckets=(128, 256, 512, 1024, 2048, 3072, 4096, 8192))
+LLM_QUEUE_WAIT = registry.histogram(
+    'proxima_llm_queue_wait_seconds', 'Time generations waited for a model slot')
+INGESTED_PAGES = registry.counter(
+    'proxima_ingested_pages_total', 'Pages chunked and embedded, by chunking mode', ('mode',))
+INGESTION_SECONDS = registry.counter(
+    'proxima_ingestion_seconds_total', 'Time spent chunking and embedding pages, by chunking mode', ('mode',))
+ERRORS = registry.counter(
+    'proxima_errors_total', 'Requests that failed or returned success=false', ('endpoint', 'status'))
+
+# Endpoint and per-stage timings (ms) of the request being served in this context
+_current = contextvars.ContextVar('proxima_request_timings', default=None)
+
+
+def begin_timings(endpoint):
+    _current.set({'endpoint': endpoint, 'stages': {}})
+
+
+def end_timings():
+    _current.set(None)
+
+
+def current_timings():
+    """Per-stage timings in ms recorded so far for the current request"""
+    current = _current.get()
+    if current is None:
+        return {}
+    return {stage: round(ms, 2) for stage, ms in current['stages'].items()}
+
+
+@contextmanager
+def timed(stage, endpoint=None):
+    """Record how long the block takes as a stage of the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        current = _current.get()
+        if endpoint is None:
+            endpoint = current['endpoint'] if current else 'background'
+        STAGE_LATENCY.observe(elapsed, endpoint=endpoint, stage=stage)
+        if current is not None:
+            current['stages'][stage] = current['stages'].get(stage, 0.0) + elapsed * 1000
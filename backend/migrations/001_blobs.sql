@@ -0,0 +1,14 @@
+-- Content-addressed upload storage: reference-counted blobs that file rows point at.
+-- db.create_all() creates the blobs table on a fresh database but never alters files.
+-- Files uploaded before this migration keep a NULL blob_sha256 and their old path.
+
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 VARCHAR(64) NOT NULL,
+    path VARCHAR(512) NOT NULL,
+    size INTEGER NOT NULL,
+    ref_count INTEGER NOT NULL,
+    created_at TIMESTAMP WITHOUT TIME ZONE,
+    PRIMARY KEY (sha256)
+);
+
+ALTER TABLE files ADD COLUMN IF NOT EXISTS blob_sha256 VARCHAR(64) REFERENCES blobs (sha256);
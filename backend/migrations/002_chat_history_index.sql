@@ -0,0 +1,4 @@
+-- Per-user history reads (keyset pages, recent turns, has_history) are served by this index.
+-- db.create_all() only creates it together with a new chat_history table.
+
+CREATE INDEX IF NOT EXISTS ix_chat_history_user_timestamp ON chat_history (user_id, timestamp);
@@ -25,6 +25,15 @@ class User(db.Model):
             'updated_at': self.updated_at.isoformat()
         }
 
+class Blob(db.Model):
+    __tablename__ = 'blobs'
+    
+    sha256 = db.Column(db.String(64), primary_key=True)
+    path = db.Column(db.String(512), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class File(db.Model):
     __tablename__ = 'files'
     
@@ -33,6 +42,7 @@ class File(db.Model):
     name = db.Column(db.String(255), nullable=False)
     path = db.Column(db.String(512), nullable=False)
     size = db.Column(db.Integer, nullable=False)
+    blob_sha256 = db.Column(db.String(64), db.ForeignKey('blobs.sha256'), nullable=True)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self):
@@ -53,6 +63,11 @@ class ChatHistory(db.Model):
     sources = db.Column(db.JSON, nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # History is always read per user, newest first
+    __table_args__ = (
+        db.Index('ix_chat_history_user_timestamp', 'user_id', 'timestamp'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -0,0 +1,154 @@
+import os
+import json
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from langchain_core.documents import Document
+
+# Configuration
+PDF_PARSE_WORKERS = int(os.environ.get('PDF_PARSE_WORKERS', min(4, os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.environ.get('PDF_PAGES_PER_TASK', 16))
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def count_pages(path):
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_page_range(path, start, end):
+    """Extract the text of pages [start, end) of a PDF"""
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        return [pdf.pages[i].extract_text() or '' for i in range(start, end)]
+
+
+class PdfParser:
+    """Extracts PDF page text on a process pool, with an on-disk cache by content hash.
+
+    Files are split into page ranges so one large PDF is spread over several
+    workers. Extracted pages are stored as ``<sha256>.json`` in cache_dir, so a file
+    seen before is never parsed again. A file that fails to parse is reported on its
+    own and does not affect the others.
+    """
+
+    def __init__(self, cache_dir, max_workers=PDF_PARSE_WORKERS, pages_per_task=PDF_PAGES_PER_TASK):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.pages_per_task = max(1, pages_per_task)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    # Spawned workers avoid forking a process that already runs threads;
+                    # they import the main module once, when the pool starts
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+        return self._executor
+
+    def parse_files(self, files):
+        """Parse (path, source_name, sha256) tuples; returns a list of (documents, error) in the same order.
+
+        sha256 may be None, in which case the file is hashed here.
+        """
+        results = [None] * len(files)
+        hashes = {}
+        page_counts = {}
+
+        # Serve cached files and count pages of the rest
+        count_futures = {}
+        for i, (path, _, sha256) in enumerate(files):
+            try:
+                hashes[i] = sha256 or file_sha256(path)
+                pages = self._read_cache(hashes[i])
+                if pages is not None:
+                    results[i] = pages
+                else:
+                    count_futures[i] = self.executor.submit(count_pages, path)
+            except Exception as e:
+                results[i] = e
+
+        # Fan page ranges of every uncached file out over the pool
+        range_futures = {}
+        for i, future in count_futures.items():
+            try:
+                page_counts[i] = future.result()
+                path = files[i][0]
+                range_futures[i] = [
+                    self.executor.submit(extract_page_range, path, start, min(start + self.pages_per_task, page_counts[i]))
+                    for start in range(0, page_counts[i], self.pages_per_task)
+                ]
+            except Exception as e:
+                results[i] = e
+
+        for i, futures in range_futures.items():
+            try:
+                pages = []
+                for future in futures:
+                    pages.extend(future.result())
+                self._write_cache(hashes[i], pages)
+                results[i] = pages
+            except Exception as e:
+                results[i] = e
+
+        if any(isinstance(result, BrokenProcessPool) for result in results):
+            # A worker died (e.g. killed while parsing); start a fresh pool next time
+            self._reset_executor()
+
+        parsed = []
+        for (path, source, _), result in zip(files, results):
+            if isinstance(result, Exception):
+                parsed.append(([], result))
+                continue
+            documents = [
+                Document(
+                    page_content=text,
+                    metadata={'source': source, 'file_path': path, 'page': page, 'total_pages': len(result)}
+                )
+                for page, text in enumerate(result)
+            ]
+            parsed.append((documents, None))
+        return parsed
+
+    def _reset_executor(self):
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _cache_path(self, sha256):
+        return os.path.join(self.cache_dir, f"{sha256}.json")
+
+    def _read_cache(self, sha256):
+        cache_path = self._cache_path(sha256)
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            with open(cache_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self, sha256, pages):
+        tmp_path = f"{self._cache_path(sha256)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(pages, f)
+        os.replace(tmp_path, self._cache_path(sha256))
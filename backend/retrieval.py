@@ -0,0 +1,90 @@
+import os
+
+# Configuration
+RETRIEVAL_MODE = os.environ.get('RETRIEVAL_MODE', 'hybrid')  # hybrid | vector
+RETRIEVAL_K = int(os.environ.get('RETRIEVAL_K', 4))
+RETRIEVAL_FETCH_K = int(os.environ.get('RETRIEVAL_FETCH_K', 20))  # Candidates each search contributes to the fusion
+RETRIEVAL_MAX_K = int(os.environ.get('RETRIEVAL_MAX_K', 50))  # Upper bounds for per-request k / fetch_k
+RETRIEVAL_MAX_FETCH_K = int(os.environ.get('RETRIEVAL_MAX_FETCH_K', 200))
+RRF_K = int(os.environ.get('RRF_K', 60))
+
+RETRIEVAL_MODES = ('hybrid', 'vector')
+
+
+class UnknownSources(ValueError):
+    """None of the sources a request was scoped to are in the user's index"""
+
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=RRF_K):
+    """Merge rankings of positions, scoring each by the sum of 1 / (rrf_k + rank) over the rankings.
+
+    Rank fusion needs no calibration between BM25 scores and vector distances; ties
+    keep the order of the first ranking.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, position in enumerate(ranking, 1):
+            scores[position] = scores.get(position, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
+
+
+class HybridRetriever:
+    """Retrieves a user's chunks with vector search fused with BM25.
+
+    Each search contributes fetch_k candidates and the top k of their reciprocal
+    rank fusion are returned. A sources filter is applied inside both searches, so
+    scoped questions get k results from the chosen files rather than whatever
+    survives filtering a global top k. Without a lexical index (or with
+    RETRIEVAL_MODE=vector) this is a plain top-k vector search.
+    """
+
+    def __init__(self, vectorstore, lexical=None, sources=None, k=RETRIEVAL_K, fetch_k=RETRIEVAL_FETCH_K,
+                 metadata=None, mode=RETRIEVAL_MODE):
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        self.vectorstore = vectorstore
+        self.lexical = lexical if mode == 'hybrid' and lexical is not None and not lexical.is_empty else None
+        self.sources = sources or {}  # {file_id: file name}
+        self.search_kwargs = {'k': k, 'fetch_k': fetch_k}
+        self.metadata = metadata or {}
+
+    @property
+    def mode(self):
+        return 'vector' if self.lexical is None else 'hybrid'
+
+    def resolve_sources(self, sources):
+        """File ids for a list of file names (or ids); None when the search is not scoped"""
+        if sources is None:
+            return None
+        wanted = set(sources)
+        file_ids = {file_id for file_id, name in self.sources.items() if name in wanted or file_id in wanted}
+        if not file_ids:
+            raise UnknownSources('None of the requested sources are in your processed documents')
+        return file_ids
+
+    def invoke(self, query, vector=None, **options):
+        """Documents for query; vector is its embedding if the caller already has it"""
+        if vector is None:
+            vector = self.vectorstore.embedding_function.embed_query(query)
+        return self.invoke_batch([query], [vector], **options)[0]
+
+    def invoke_batch(self, queries, vectors, k=None, fetch_k=None, sources=None, nprobe=None, ef_search=None):
+        """Documents for each query, given its embedding; the vector search is one FAISS call for all of them"""
+        k = k or self.search_kwargs['k']
+        fetch_k = max(k, fetch_k or self.search_kwargs['fetch_k'])
+        file_ids = self.resolve_sources(sources)
+
+        _, positions = self.vectorstore.search_positions(
+            vectors, k if self.lexical is None else fetch_k, file_ids, nprobe, ef_search
+        )
+        ranges = self.vectorstore.file_ranges if self.lexical is not None else None
+
+        results = []
+        for query, row in zip(queries, positions):
+            ranking = [int(position) for position in row if position != -1]
+            if self.lexical is not None:
+                lexical = [ranges[file_id][0] + n for file_id, n, _ in self.lexical.search(query, fetch_k, file_ids)
+                           if file_id in ranges and n < ranges[file_id][1]]
+                ranking = reciprocal_rank_fusion([ranking, lexical], k)
+            results.append([self.vectorstore.document(position) for position in ranking[:k]])
+        return results
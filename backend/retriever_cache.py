@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Configuration
+RETRIEVER_CACHE_MAX_ENTRIES = int(os.environ.get('RETRIEVER_CACHE_MAX_ENTRIES', 100))
+RETRIEVER_CACHE_MAX_BYTES = int(os.environ.get('RETRIEVER_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+
+
+class RetrieverCache:
+    """LRU cache of per-user retrievers, loaded from disk on first use.
+
+    Entries are evicted least-recently-used first once either max_entries or
+    max_bytes (0 disables a limit) is exceeded. Concurrent misses for the same user
+    wait on a single load instead of each reading the index from disk. With
+    version_fn, an entry whose index was saved again since it was loaded (e.g. by
+    another worker process) is reloaded on its next use.
+    """
+
+    def __init__(self, load_fn, exists_fn, max_entries=RETRIEVER_CACHE_MAX_ENTRIES, max_bytes=RETRIEVER_CACHE_MAX_BYTES,
+                 version_fn=None):
+        self.load_fn = load_fn
+        self.exists_fn = exists_fn
+        self.version_fn = version_fn or (lambda user_id: None)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # {user_id: (retriever, size_bytes, disk_version)}
+        self._loading = {}  # In-flight loads: {user_id: Future}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.load_errors = 0
+        self.load_time_ms = 0.0
+        self.evictions = 0
+        self.reloads = 0
+
+    def __contains__(self, user_id):
+        with self._lock:
+            if user_id in self._entries:
+                return True
+        return self.exists_fn(user_id)
+
+    def get(self, user_id):
+        """Return the user's retriever, loading it if needed, or None if there is no index"""
+        version = self.version_fn(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                if entry[2] == version:
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return entry[0]
+                self._remove(user_id)
+                self.reloads += 1
+
+            self.misses += 1
+            future = self._loading.get(user_id)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._loading[user_id] = future
+
+        if not owner:
+            return future.result()
+
+        start_time = time.time()
+        try:
+            index = self.load_fn(user_id)
+            retriever = None if index.is_empty else index.as_retriever()
+            size = 0 if index.is_empty else index.estimate_bytes()
+        except Exception as e:
+            with self._lock:
+                self.load_errors += 1
+                self._loading.pop(user_id, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self.loads += 1
+            self.load_time_ms += (time.time() - start_time) * 1000
+            self._loading.pop(user_id, None)
+            if retriever is not None:
+                self._store(user_id, retriever, size, version)
+        future.set_result(retriever)
+        return retriever
+
+    def put(self, user_id, index):
+        """Replace the cached retriever with a freshly saved index"""
+        version = self.version_fn(user_id)
+        with self._lock:
+            self._remove(user_id)
+            if not index.is_empty:
+                self._store(user_id, index.as_retriever(), index.estimate_bytes(), version)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._remove(user_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'loads': self.loads,
+                'load_errors': self.load_errors,
+                'load_time_ms': round(self.load_time_ms, 2),
+                'evictions': self.evictions,
+                'reloads': self.reloads
+            }
+
+    def _store(self, user_id, retriever, size, version):
+        self._entries[user_id] = (retriever, size, version)
+        self._bytes += size
+        while len(self._entries) > 1 and self._over_budget():
+            evicted_id, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def _remove(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _over_budget(self):
+        if self.max_entries and len(self._entries) > self.max_entries:
+            return True
+        return bool(self.max_bytes) and self._bytes > self.max_bytes
@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+
+import summarize_locust_results
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BACKEND_DIR, 'bench_results')
+# Committed reference results (locust_results_*.csv); runs never write over them
+COMMITTED_PREFIX = os.path.join(BACKEND_DIR, 'locust_results')
+
+
+def wait_until_up(host, timeout=300):
+    """Wait for /readyz, so warmup (model load, imports) is not measured as request latency"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{host}/readyz", timeout=2):
+                return True
+        except OSError:
+            time.sleep(0.5)
+    return False
+
+
+def start_server(port, workdir, token_delay_ms):
+    """Start the backend against SQLite and the stub LLM so the benchmark needs no external services"""
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+        'VECTOR_STORE_FOLDER': os.path.join(workdir, 'vector_stores'),
+        'LLM_BACKEND': 'stub',
+        'STUB_LLM_TOKEN_DELAY_MS': str(token_delay_ms)
+    })
+    return subprocess.Popen(
+        [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(port), '--no-reload', '--with-threads'],
+        cwd=BACKEND_DIR,
+        env=env
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the Locust benchmark offline and summarize per-endpoint latency')
+    parser.add_argument('--host', help='Benchmark an already running server instead of starting one')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--spawn-rate', type=float, default=5)
+    parser.add_argument('--duration', default='60s')
+    parser.add_argument('--token-delay-ms', type=float, default=20, help='Per-token delay of the stub LLM')
+    parser.add_argument('--csv-prefix', help="Locust CSV prefix, relative to backend/ (default: bench_results/<timestamp>)")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help='Summary JSON to compare against; exits non-zero on regressions')
+    parser.add_argument('--tolerance', type=float, default=summarize_locust_results.DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+    if args.csv_prefix is None:
+        args.csv_prefix = os.path.join(RESULTS_DIR, time.strftime('%Y%m%d-%H%M%S'))
+    csv_prefix = os.path.join(BACKEND_DIR, args.csv_prefix)
+    if os.path.abspath(csv_prefix) == COMMITTED_PREFIX:
+        parser.error('--csv-prefix would overwrite the committed locust_results_*.csv; choose another prefix')
+    os.makedirs(os.path.dirname(csv_prefix), exist_ok=True)
+
+    server = None
+    host = args.host
+    if host is None:
+        workdir = tempfile.mkdtemp(prefix='proxima-bench-')
+        server = start_server(args.port, workdir, args.token_delay_ms)
+        host = f"http://127.0.0.1:{args.port}"
+        if not wait_until_up(host):
+            server.terminate()
+            print("Backend did not start")
+            return 1
+
+    try:
+        subprocess.run(
+            [sys.executable, '-m', 'locust', '-f', 'locustfile.py', '--headless',
+             '-u', str(args.users), '-r', str(args.spawn_rate), '-t', args.duration,
+             '--host', host, '--csv', csv_prefix],
+            cwd=BACKEND_DIR,
+            check=False
+        )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    print(f"Locust CSVs written to {csv_prefix}_*.csv")
+    summary_args = ['--stats', f"{csv_prefix}_stats.csv", '--output', args.output]
+    if args.baseline:
+        summary_args += ['--baseline', args.baseline, '--tolerance', str(args.tolerance)]
+    return summarize_locust_results.main(summary_args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
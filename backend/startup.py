@@ -0,0 +1,122 @@
+import os
+import time
+import threading
+import multiprocessing
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from metrics import registry
+
+# Configuration
+WARMUP_RETRY_DELAY = float(os.environ.get('WARMUP_RETRY_DELAY', 1))  # Seconds before a failed step is retried, doubling
+WARMUP_RETRY_MAX_DELAY = float(os.environ.get('WARMUP_RETRY_MAX_DELAY', 60))
+
+WARMING = 'warming'
+READY = 'ready'
+FAILED = 'failed'
+
+
+def in_child_process():
+    """Whether this is a multiprocessing child, e.g. a PDF pool worker re-importing the app as __mp_main__"""
+    return multiprocessing.current_process().name != 'MainProcess'
+
+
+class Startup:
+    """Startup phase timings and readiness of subsystems warmed in the background.
+
+    Import-time phases are recorded with phase(); heavy subsystems (database schema,
+    FAISS, the LLM chain, the embedding model) are initialised one after another by
+    start_warmup() on a daemon thread, so the process can serve liveness checks and
+    auth requests while they load. Steps that fail are retried with backoff until
+    they succeed, so a dependency that is slow to come up only delays readiness.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._phases = OrderedDict()  # {phase: ms}
+        self._subsystems = OrderedDict()  # {name: (status, error)}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._first_pass = threading.Event()
+        registry.add_collector(self._collect_metrics)
+
+    def record(self, name, ms):
+        with self._lock:
+            self._phases[name] = round(ms, 2)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+
+    def start_warmup(self, steps, logger=None):
+        """Run [(subsystem, fn)] in order on a background thread"""
+        if in_child_process():
+            # Worker processes of the PDF pool import the app module too; they serve no requests
+            return
+        with self._lock:
+            for name, _ in steps:
+                self._subsystems[name] = (WARMING, None)
+        self._thread = threading.Thread(target=self._warm_up, args=(steps, logger), name='warmup', daemon=True)
+        self._thread.start()
+
+    def _warm_up(self, steps, logger):
+        pending = [step for step in steps if not self._run_step(*step, logger)]
+        self._first_pass.set()
+        delay = WARMUP_RETRY_DELAY
+        while pending:
+            time.sleep(delay)
+            delay = min(delay * 2, WARMUP_RETRY_MAX_DELAY)
+            pending = [step for step in pending if not self._run_step(*step, logger)]
+        if logger is not None:
+            logger.info(f"Startup phases (ms): {self.report()['phases_ms']}")
+
+    def _run_step(self, name, fn, logger):
+        """Run one warmup step; returns whether it succeeded"""
+        try:
+            with self.phase(f'warmup_{name}'):
+                fn()
+        except Exception as e:
+            with self._lock:
+                self._subsystems[name] = (FAILED, str(e))
+            if logger is not None:
+                logger.error(f"Warmup of {name} failed, will retry: {e}")
+            return False
+        with self._lock:
+            self._subsystems[name] = (READY, None)
+        return True
+
+    def wait(self, timeout=None):
+        """Block until every warmup step has been tried once"""
+        if self._thread is not None:
+            self._first_pass.wait(timeout)
+
+    @property
+    def ready(self):
+        with self._lock:
+            return all(status == READY for status, _ in self._subsystems.values())
+
+    def report(self):
+        with self._lock:
+            subsystems = {
+                name: {'status': status, **({'error': error} if error else {})}
+                for name, (status, error) in self._subsystems.items()
+            }
+            return {
+                'ready': all(status == READY for status, _ in self._subsystems.values()),
+                'uptime_s': round(time.time() - self.started_at, 1),
+                'subsystems': subsystems,
+                'phases_ms': dict(self._phases)
+            }
+
+    def _collect_metrics(self):
+        report = self.report()
+        return [
+            ('proxima_startup_phase_seconds', 'gauge', 'Duration of startup and warmup phases',
+             [({'phase': name}, ms / 1000) for name, ms in report['phases_ms'].items()]),
+            ('proxima_subsystem_ready', 'gauge', 'Whether a warmed subsystem is ready (1) or not (0)',
+             [({'subsystem': name}, int(info['status'] == READY)) for name, info in report['subsystems'].items()])
+        ]
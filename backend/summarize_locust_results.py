@@ -1,22 +1,92 @@
-import pandas as pd
-
-# Load the requests CSV generated by Locust
-df = pd.read_csv("locust_results_requests.csv")
-
-# Filter for /api/chat endpoint
-chat_df = df[df['Name'].str.contains('/api/chat')]
-
-# Calculate summary stats
-summary = {
-    "Total Requests": chat_df['Request Count'].sum(),
-    "Failures": chat_df['Failure Count'].sum(),
-    "Median Response Time (ms)": chat_df['Median Response Time'].median(),
-    "Average Response Time (ms)": chat_df['Average Response Time'].mean(),
-    "95th Percentile Response Time (ms)": chat_df['95th Percentile Response Time'].max(),
-    "Requests Per Second": chat_df['Requests/s'].sum(),
-    "Failure Rate (%)": 100 * chat_df['Failure Count'].sum() / chat_df['Request Count'].sum() if chat_df['Request Count'].sum() > 0 else 0
-}
-
-print("Locust /api/chat Endpoint Summary:")
-for k, v in summary.items():
-    print(f"{k}: {v}")
\ No newline at end of file
+import sys
+import csv
+import json
+import argparse
+
+DEFAULT_TOLERANCE = 0.2  # Allowed relative slowdown before a metric counts as a regression
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def summarize(stats_csv):
+    """Per-endpoint request counts, failure rate, p50/p95/p99 (ms) and throughput from Locust's stats CSV"""
+    summary = {}
+    with open(stats_csv, newline='') as f:
+        for row in csv.DictReader(f):
+            name = f"{row['Type']} {row['Name']}" if row['Type'] else row['Name']
+            requests = int(row['Request Count'])
+            failures = int(row['Failure Count'])
+            summary[name] = {
+                'requests': requests,
+                'failures': failures,
+                'failure_rate': round(failures / requests, 4) if requests else 0.0,
+                'p50_ms': _number(row['50%']),
+                'p95_ms': _number(row['95%']),
+                'p99_ms': _number(row['99%']),
+                'avg_ms': round(float(row['Average Response Time']), 2),
+                'rps': round(float(row['Requests/s']), 3)
+            }
+    return summary
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Return a list of regressions of results against baseline"""
+    regressions = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if base.get(metric) and current.get(metric) and current[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {base[metric]:.0f} -> {current[metric]:.0f}")
+        if base.get('rps') and current['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append(f"{name}: rps {base['rps']:.2f} -> {current['rps']:.2f}")
+        if current['failure_rate'] > base['failure_rate'] + 0.01:
+            regressions.append(f"{name}: failure rate {base['failure_rate']:.2%} -> {current['failure_rate']:.2%}")
+    return regressions
+
+
+def print_summary(summary):
+    print(f"{'Endpoint':<36}{'Reqs':>8}{'Fail%':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'RPS':>9}")
+    for name, stats in summary.items():
+        print(
+            f"{name:<36}{stats['requests']:>8}{stats['failure_rate'] * 100:>7.1f}%"
+            f"{stats['p50_ms'] or 0:>9.0f}{stats['p95_ms'] or 0:>9.0f}{stats['p99_ms'] or 0:>9.0f}{stats['rps']:>9.2f}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Summarize Locust results and compare them with a baseline')
+    parser.add_argument('--stats', default='locust_results_stats.csv', help="Locust's <prefix>_stats.csv")
+    parser.add_argument('--output', help='Write the summary as JSON to this file')
+    parser.add_argument('--baseline', help='Summary JSON from an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    summary = summarize(args.stats)
+    print_summary(summary)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(summary, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
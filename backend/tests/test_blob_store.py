@@ -0,0 +1,82 @@
+import hashlib
+import io
+import os
+
+import pytest
+from flask import Flask
+
+from blob_store import BlobStore
+from models import db, Blob
+
+
+@pytest.fixture
+def store(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'app.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield BlobStore(str(tmp_path / 'blobs'))
+        db.session.remove()
+
+
+def upload(store, content):
+    tmp_path, sha256, size = store.write_stream(io.BytesIO(content))
+    path = store.add_reference(tmp_path, sha256, size)
+    db.session.commit()
+    return sha256, path
+
+
+def ref_count(sha256):
+    blob = db.session.get(Blob, sha256, populate_existing=True)
+    return None if blob is None else blob.ref_count
+
+
+def test_identical_uploads_share_one_blob(store):
+    sha256, path = upload(store, b'%PDF-1.4 same bytes')
+    assert sha256 == hashlib.sha256(b'%PDF-1.4 same bytes').hexdigest()
+    assert upload(store, b'%PDF-1.4 same bytes') == (sha256, path)
+    assert ref_count(sha256) == 2
+    with open(path, 'rb') as f:
+        assert f.read() == b'%PDF-1.4 same bytes'
+    assert os.listdir(store.tmp_dir) == []
+
+    store.release(sha256)
+    assert ref_count(sha256) == 1 and os.path.exists(path)
+    store.release(sha256)
+    assert ref_count(sha256) is None and not os.path.exists(path)
+    assert os.listdir(store.tmp_dir) == []
+
+
+def test_release_keeps_other_blobs(store):
+    first, first_path = upload(store, b'first')
+    second, second_path = upload(store, b'second')
+    store.release(first)
+    assert ref_count(first) is None and not os.path.exists(first_path)
+    assert ref_count(second) == 1 and os.path.exists(second_path)
+
+
+def test_abandon_removes_bytes_of_a_rolled_back_upload(store):
+    tmp_path, sha256, size = store.write_stream(io.BytesIO(b'never committed'))
+    path = store.add_reference(tmp_path, sha256, size)
+    db.session.rollback()
+    store.abandon(sha256)
+    assert ref_count(sha256) is None and not os.path.exists(path)
+
+
+def test_abandon_keeps_bytes_another_upload_committed(store):
+    sha256, path = upload(store, b'shared')
+    tmp_path, _, size = store.write_stream(io.BytesIO(b'shared'))
+    store.add_reference(tmp_path, sha256, size)
+    db.session.rollback()
+    store.abandon(sha256)
+    assert ref_count(sha256) == 1 and os.path.exists(path)
+
+
+def test_rejected_stream_leaves_no_temporary_file(store):
+    def reject(block):
+        raise ValueError('not a PDF')
+
+    with pytest.raises(ValueError):
+        store.write_stream(io.BytesIO(b'plain text'), on_block=reject)
+    assert os.listdir(store.tmp_dir) == []
@@ -0,0 +1,71 @@
+import hashlib
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_experimental.text_splitter import SemanticChunker
+
+from chunking import Chunker, PooledSemanticChunker
+
+TEXT = (
+    "Invoices are due within thirty days. Late invoices accrue interest monthly. "
+    "Interest is two percent per month. The warranty covers parts for one year! "
+    "Labour is covered for ninety days. Claims need the original receipt? "
+    "Shipping is free above one hundred euros. Returns are accepted within two weeks. "
+    "Refunds go back to the original payment method. Support answers within a day."
+)
+
+
+class TopicEmbeddings:
+    """Deterministic embeddings: texts sharing a topic word point the same way"""
+
+    topics = ('invoice', 'interest', 'warrant', 'labour', 'claim', 'ship', 'return', 'refund', 'support')
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+    def _embed(self, text):
+        seed = int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+        vector = np.random.default_rng(seed).standard_normal(16) * 0.1
+        for n, topic in enumerate(self.topics):
+            if topic in text.lower():
+                vector[n % 16] += 1.0
+        return vector.tolist()
+
+
+def test_pooled_chunker_splits_like_semantic_chunker():
+    for kwargs in ({}, {'breakpoint_threshold_type': 'standard_deviation', 'breakpoint_threshold_amount': 0.5},
+                   {'number_of_chunks': 3}, {'min_chunk_size': 120}, {'buffer_size': 0}):
+        expected = SemanticChunker(TopicEmbeddings(), **kwargs).split_text(TEXT)
+        pooled = PooledSemanticChunker(TopicEmbeddings(), **kwargs).split_text_with_vectors(TEXT)
+        assert [chunk for chunk, _ in pooled] == expected
+        assert len(expected) > 1
+        assert all(vector is not None for _, vector in pooled)
+
+
+def test_chunk_vectors_pool_the_sentence_embeddings_once():
+    embeddings = TopicEmbeddings()
+    pooled = PooledSemanticChunker(embeddings, buffer_size=0).split_text_with_vectors(TEXT)
+    # The sentences were embedded in one call and the chunks were not embedded again
+    assert len(embeddings.calls) == 1
+    first_chunk, vector = pooled[0]
+    sentences = [sentence for sentence in embeddings.calls[0] if sentence in first_chunk]
+    vectors = np.array([embeddings._embed(sentence) for sentence in sentences])
+    expected = vectors.mean(axis=0)
+    expected *= np.linalg.norm(vectors, axis=1).mean() / np.linalg.norm(expected)
+    assert np.allclose(vector, expected, atol=1e-5)
+
+
+def test_chunker_embeds_texts_too_short_to_split():
+    embeddings = TopicEmbeddings()
+    chunks, vectors = Chunker(embeddings, mode='semantic_pooled').split(
+        [Document(page_content='One sentence only', metadata={'page': 1}), Document(page_content=TEXT, metadata={'page': 2})])
+    assert chunks[0].page_content == 'One sentence only' and chunks[0].metadata == {'page': 1}
+    assert len(vectors) == len(chunks) and all(vector is not None for vector in vectors)
+    assert embeddings.calls[-1] == ['One sentence only']
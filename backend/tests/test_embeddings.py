@@ -0,0 +1,76 @@
+import sqlite3
+import threading
+import time
+
+import embeddings
+from embeddings import BatchedEmbeddings
+
+
+class SlowModel:
+    """Takes a fixed time per batch and records the batches it was given"""
+
+    def __init__(self, seconds_per_batch):
+        self.seconds_per_batch = seconds_per_batch
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        time.sleep(self.seconds_per_batch)
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_vectors_keep_the_order_of_the_texts():
+    embedder = BatchedEmbeddings(lambda: SlowModel(0), max_batch_size=4)
+    texts = ['x' * n for n in range(1, 11)]
+    assert [vector[0] for vector in embedder.embed_documents(texts)] == list(range(1, 11))
+    assert embedder.embed_query('abc') == [3.0, 1.0]
+    assert embedder.embed_documents([]) == []
+
+
+def test_query_during_large_ingest_waits_for_one_batch_only():
+    model = SlowModel(0.1)
+    embedder = BatchedEmbeddings(lambda: model, max_batch_size=64, max_wait_ms=0)
+    embedder.embed_query('warm up')
+
+    ingest = threading.Thread(target=embedder.embed_documents, args=([f'chunk {n}' for n in range(640)],))
+    start = time.monotonic()
+    ingest.start()
+    time.sleep(0.05)
+    embedder.embed_query('question')
+    query_seconds = time.monotonic() - start
+    ingest.join()
+    ingest_seconds = time.monotonic() - start
+
+    # Ten 0.1 s document batches; the query only waits for the one being encoded
+    assert ingest_seconds >= 1.0
+    assert query_seconds < 0.4
+    assert ['question'] in model.batches[:4]
+
+
+def test_batches_never_exceed_the_maximum_size():
+    model = SlowModel(0.01)
+    embedder = BatchedEmbeddings(lambda: model, max_batch_size=8, max_wait_ms=20)
+    threads = [threading.Thread(target=embedder.embed_documents, args=([f'{n}-{i}' for i in range(5)],))
+               for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(len(batch) <= 8 for batch in model.batches)
+    assert sum(len(batch) for batch in model.batches) == 30
+
+
+def test_only_the_cached_embedder_fills_the_cache(tmp_path, monkeypatch):
+    cache_path = str(tmp_path / 'cache.sqlite3')
+    monkeypatch.setattr(embeddings, '_load_embedding_model', lambda: SlowModel(0))
+    monkeypatch.setattr(embeddings, '_embedder', None)
+    monkeypatch.setattr(embeddings, '_model_embedder', None)
+    monkeypatch.setattr(embeddings, '_embedding_cache_path', cache_path)
+
+    uncached = embeddings.get_embedder(cached=False)
+    uncached.embed_documents(['sentence window one', 'sentence window two'])
+    embeddings.get_embedder().embed_documents(['indexed chunk'])
+
+    assert embeddings.get_embedder().embedder is uncached
+    with sqlite3.connect(cache_path) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM embeddings').fetchone() == (1,)
@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pytest
+
+from llm_scheduler import LLMScheduler, LLMSchedulerBusy
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'condition not reached'
+        time.sleep(0.005)
+
+
+def queue_in_background(scheduler, user_id, granted):
+    def run():
+        with scheduler.slot(user_id):
+            granted.append(user_id)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_waiting_users_are_served_round_robin():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=10, max_queued_per_user=5, max_wait=5)
+    lease = scheduler.acquire('first')
+    granted = []
+    threads = []
+    for user_id in ('heavy', 'heavy', 'heavy', 'light'):
+        threads.append(queue_in_background(scheduler, user_id, granted))
+        wait_until(lambda: scheduler.stats()['queued'] == len(threads))
+
+    lease.release()
+    lease.release()  # Idempotent
+    for thread in threads:
+        thread.join()
+    assert granted == ['heavy', 'light', 'heavy', 'heavy']
+    stats = scheduler.stats()
+    assert stats['running'] == 0 and stats['queued'] == 0 and stats['admitted'] == 5
+
+
+def test_full_queues_reject_immediately():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=2, max_queued_per_user=1, max_wait=5)
+    lease = scheduler.acquire('first')
+    granted = []
+    threads = [queue_in_background(scheduler, 'a', granted)]
+    wait_until(lambda: scheduler.stats()['queued'] == 1)
+
+    with pytest.raises(LLMSchedulerBusy, match='Too many requests') as e:
+        scheduler.acquire('a')
+    assert e.value.retry_after >= 1
+    threads.append(queue_in_background(scheduler, 'b', granted))
+    wait_until(lambda: scheduler.stats()['queued'] == 2)
+    with pytest.raises(LLMSchedulerBusy, match='busy'):
+        scheduler.acquire('c')
+
+    lease.release()
+    for thread in threads:
+        thread.join()
+    assert granted == ['a', 'b'] and scheduler.stats()['rejected'] == 2
+
+
+def test_request_times_out_without_a_slot():
+    scheduler = LLMScheduler(max_concurrency=1, max_wait=0.05)
+    lease = scheduler.acquire('first')
+    with pytest.raises(LLMSchedulerBusy, match='Timed out'):
+        scheduler.acquire('second')
+    stats = scheduler.stats()
+    assert stats['queued'] == 0 and stats['queued_users'] == 0 and stats['timed_out'] == 1
+    lease.release()
+    scheduler.acquire('second').release()
+
+
+def test_identical_prompts_share_one_generation():
+    scheduler = LLMScheduler(max_concurrency=2, max_wait=5)
+    started = threading.Event()
+    finish = threading.Event()
+    calls = []
+
+    def generate():
+        calls.append(1)
+        started.set()
+        finish.wait(2)
+        return 'answer'
+
+    results = []
+    owner = threading.Thread(target=lambda: results.append(scheduler.run('a', 'prompt', generate)))
+    owner.start()
+    started.wait(2)
+    follower = threading.Thread(target=lambda: results.append(scheduler.run('b', 'prompt', generate)))
+    follower.start()
+    wait_until(lambda: scheduler.stats()['coalesced'] == 1)
+    finish.set()
+    owner.join()
+    follower.join()
+    assert results == ['answer', 'answer'] and calls == [1]
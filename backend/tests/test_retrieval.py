@@ -0,0 +1,24 @@
+import pytest
+
+from retrieval import HybridRetriever, UnknownSources, reciprocal_rank_fusion
+
+
+def test_fusion_favours_positions_ranked_by_both_searches():
+    vector = [1, 2, 3, 4]
+    lexical = [4, 5, 1]
+    assert reciprocal_rank_fusion([vector, lexical], k=3, rrf_k=60) == [1, 4, 2]
+
+
+def test_fusion_keeps_the_first_ranking_order_on_ties():
+    assert reciprocal_rank_fusion([[7, 8], [8, 7]], k=2) == [7, 8]
+    assert reciprocal_rank_fusion([[3, 2, 1], []], k=10) == [3, 2, 1]
+    assert reciprocal_rank_fusion([[], []], k=4) == []
+
+
+def test_sources_resolve_by_name_or_id():
+    retriever = HybridRetriever(vectorstore=None, sources={'f1': 'report.pdf', 'f2': 'notes.pdf'})
+    assert retriever.mode == 'vector'
+    assert retriever.resolve_sources(None) is None
+    assert retriever.resolve_sources(['report.pdf', 'f2']) == {'f1', 'f2'}
+    with pytest.raises(UnknownSources):
+        retriever.resolve_sources(['missing.pdf'])
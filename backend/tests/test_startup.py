@@ -0,0 +1,32 @@
+import threading
+import time
+
+import startup
+from startup import Startup, READY, FAILED
+
+
+def test_failed_steps_are_retried_until_ready(monkeypatch):
+    monkeypatch.setattr(startup, 'WARMUP_RETRY_DELAY', 0.01)
+    database_up = threading.Event()
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        if not database_up.is_set():
+            raise ConnectionError('not up yet')
+
+    boot = Startup()
+    boot.start_warmup([('database', connect), ('model', lambda: None)])
+    boot.wait(5)
+    report = boot.report()
+    assert report['subsystems']['model']['status'] == READY
+    assert report['subsystems']['database'] == {'status': FAILED, 'error': 'not up yet'}
+    assert not boot.ready
+
+    time.sleep(0.05)
+    database_up.set()
+    deadline = time.monotonic() + 5
+    while not boot.ready and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert boot.ready
+    assert len(attempts) >= 3
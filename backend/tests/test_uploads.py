@@ -0,0 +1,129 @@
+import hashlib
+import io
+import os
+import threading
+import time
+
+import pytest
+
+import uploads
+from uploads import UploadError, UploadOffsetMismatch, UploadSessions
+
+
+PDF = b'%PDF-1.4\n' + b'1 0 obj << /Type /Page >> endobj\n' * 200 + b'%%EOF\n'
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    return UploadSessions(str(tmp_path / 'uploads'))
+
+
+def test_concurrent_appends_and_expiry_keep_state_consistent(sessions, monkeypatch):
+    monkeypatch.setattr(uploads, 'EXPIRE_INTERVAL', 0)
+    upload_ids = [sessions.create('user', f'{n}.pdf', len(PDF))['upload_id'] for n in range(8)]
+    errors = []
+
+    def upload(upload_id):
+        try:
+            for offset in range(0, len(PDF), 100):
+                sessions.append('user', upload_id, offset, io.BytesIO(PDF[offset:offset + 100]))
+                sessions.status('user', upload_id)
+            sessions.complete('user', upload_id)
+            sessions.discard(upload_id)
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=upload, args=(upload_id,)) for upload_id in upload_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    sessions.expire()
+    assert sessions._progress == {} and sessions._locks == {}
+
+
+def test_append_complete_round_trip(sessions):
+    status = sessions.create('user', 'doc.pdf', len(PDF))
+    upload_id = status['upload_id']
+    assert status['offset'] == 0 and status['size'] == len(PDF)
+
+    status = sessions.append('user', upload_id, 0, io.BytesIO(PDF[:1000]))
+    assert status['offset'] == 1000
+    status = sessions.append('user', upload_id, 1000, io.BytesIO(PDF[1000:]))
+    assert status['offset'] == len(PDF) and status['pages'] == 200
+
+    path, sha256, size, pages = sessions.complete('user', upload_id, hashlib.sha256(PDF).hexdigest().upper())
+    assert (sha256, size, pages) == (hashlib.sha256(PDF).hexdigest(), len(PDF), 200)
+    with open(path, 'rb') as f:
+        assert f.read() == PDF
+    sessions.discard(upload_id)
+    with pytest.raises(UploadError) as e:
+        sessions.status('user', upload_id)
+    assert e.value.status == 404
+
+
+def test_resume_reports_the_offset_to_continue_from(sessions, tmp_path):
+    upload_id = sessions.create('user', 'doc.pdf', len(PDF))['upload_id']
+    sessions.append('user', upload_id, 0, io.BytesIO(PDF[:3000]))
+
+    with pytest.raises(UploadOffsetMismatch) as e:
+        sessions.append('user', upload_id, 2000, io.BytesIO(PDF[2000:]))
+    assert e.value.status == 409 and e.value.offset == 3000
+
+    # Another worker, which never saw the first part, continues from the reported offset
+    other = UploadSessions(sessions.root)
+    offset = other.status('user', upload_id)['offset']
+    other.append('user', upload_id, offset, io.BytesIO(PDF[offset:]))
+    assert other.complete('user', upload_id)[1] == hashlib.sha256(PDF).hexdigest()
+
+
+def test_complete_rejects_missing_bytes_and_wrong_checksum(sessions):
+    upload_id = sessions.create('user', 'doc.pdf', len(PDF))['upload_id']
+    sessions.append('user', upload_id, 0, io.BytesIO(PDF[:-10]))
+    with pytest.raises(UploadOffsetMismatch):
+        sessions.complete('user', upload_id)
+
+    sessions.append('user', upload_id, len(PDF) - 10, io.BytesIO(PDF[-10:]))
+    with pytest.raises(UploadError, match='Checksum'):
+        sessions.complete('user', upload_id, '0' * 64)
+
+
+def test_part_past_the_declared_size_is_rejected_but_kept_resumable(sessions):
+    upload_id = sessions.create('user', 'doc.pdf', 100)['upload_id']
+    with pytest.raises(UploadError) as e:
+        sessions.append('user', upload_id, 0, io.BytesIO(PDF[:200]))
+    assert e.value.status == 413
+    assert sessions.status('user', upload_id)['upload_id'] == upload_id
+
+
+def test_non_pdf_upload_is_aborted(sessions):
+    upload_id = sessions.create('user', 'notes.txt', 100)['upload_id']
+    with pytest.raises(UploadError, match='not a PDF'):
+        sessions.append('user', upload_id, 0, io.BytesIO(b'plain text ' * 9 + b'.'))
+    with pytest.raises(UploadError):
+        sessions.status('user', upload_id)
+
+
+def test_abort_is_limited_to_the_owner(sessions):
+    upload_id = sessions.create('user', 'doc.pdf', len(PDF))['upload_id']
+    sessions.append('user', upload_id, 0, io.BytesIO(PDF[:500]))
+    with pytest.raises(UploadError) as e:
+        sessions.abort('someone else', upload_id)
+    assert e.value.status == 404
+
+    sessions.abort('user', upload_id)
+    assert not os.path.exists(os.path.join(sessions.root, upload_id))
+    assert upload_id not in sessions._progress
+
+
+def test_expire_drops_uploads_older_than_the_ttl(tmp_path):
+    sessions = UploadSessions(str(tmp_path / 'uploads'), ttl=60)
+    old = sessions.create('user', 'old.pdf', len(PDF))['upload_id']
+    new = sessions.create('user', 'new.pdf', len(PDF))['upload_id']
+    meta_path = os.path.join(sessions.root, old, 'meta.json')
+    os.utime(meta_path, (time.time() - 120, time.time() - 120))
+
+    sessions.expire()
+    assert os.listdir(sessions.root) == [new]
@@ -0,0 +1,145 @@
+import hashlib
+import os
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+import vector_index
+from vector_index import UserIndex, FILES_FOLDER, SNAPSHOT_FOLDER
+
+
+class WordEmbeddings(Embeddings):
+    """Bag-of-words vectors, so a chunk is nearest to a query made of its own words"""
+
+    dimension = 32
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dimension] += 1.0
+        return vector.tolist()
+
+
+def chunks(*texts, name='file.pdf'):
+    return [Document(page_content=text, metadata={'source': name, 'page': n}) for n, text in enumerate(texts)]
+
+
+def search(index, query, **options):
+    retriever = index.as_retriever()
+    return [doc.page_content for doc in retriever.invoke(query, index.embedder.embed_query(query), **options)]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'index')
+
+
+def test_save_load_remove_round_trip(path):
+    embedder = WordEmbeddings()
+    with UserIndex.lock(path):
+        index = UserIndex.load(path, embedder)
+        assert index.is_empty and not UserIndex.exists(path)
+        index.add_file('a', 'a.pdf', chunks('apples grow on trees', 'pears are green', name='a.pdf'))
+        index.add_file('b', 'b.pdf', chunks('rockets reach orbit', 'satellites circle earth', name='b.pdf'))
+        index.save()
+    assert UserIndex.exists(path)
+
+    for loaded in (UserIndex.load(path, embedder), UserIndex.load(path, embedder, for_search=True)):
+        assert loaded.file_ids == {'a', 'b'}
+        assert loaded.version == index.version
+        assert search(loaded, 'rockets reach orbit', k=1) == ['rockets reach orbit']
+        assert search(loaded, 'pears are green', k=1, sources=['a.pdf']) == ['pears are green']
+
+    with UserIndex.lock(path):
+        index = UserIndex.load(path, embedder)
+        assert index.remove_file('a')
+        assert not index.remove_file('a')
+        index.save()
+
+    loaded = UserIndex.load(path, embedder, for_search=True)
+    assert loaded.file_ids == {'b'}
+    assert set(search(loaded, 'apples grow on trees', k=4)) == {'rockets reach orbit', 'satellites circle earth'}
+    # Only segments still referenced by the manifest or a kept snapshot remain
+    segments = os.listdir(os.path.join(path, FILES_FOLDER))
+    assert loaded.manifest['files']['b']['segment'] in segments
+
+    with UserIndex.lock(path):
+        index = UserIndex.load(path, embedder)
+        index.remove_file('b')
+        index.save()
+    assert UserIndex.load(path, embedder).is_empty and not UserIndex.exists(path)
+
+
+def test_readding_a_file_replaces_its_chunks(path):
+    embedder = WordEmbeddings()
+    index = UserIndex.load(path, embedder)
+    index.add_file('a', 'a.pdf', chunks('first draft', 'old appendix'))
+    index.save()
+    ids = index.add_file('a', 'a.pdf', chunks('final text'))
+    index.save()
+
+    loaded = UserIndex.load(path, embedder, for_search=True)
+    assert ids == ['a:0'] and loaded.manifest['files']['a']['chunk_ids'] == ['a:0']
+    assert search(loaded, 'old appendix', k=4) == ['final text']
+
+
+def test_given_vectors_are_stored_without_embedding(path):
+    class NoEmbeddings(WordEmbeddings):
+        def embed_documents(self, texts):
+            raise AssertionError('chunks with vectors must not be embedded again')
+
+    embedder = NoEmbeddings()
+    index = UserIndex.load(path, embedder)
+    documents = chunks('alpha beta', 'gamma delta')
+    index.add_file('a', 'a.pdf', documents, WordEmbeddings().embed_documents([doc.page_content for doc in documents]))
+    index.save()
+    assert search(UserIndex.load(path, embedder, for_search=True), 'gamma delta', k=1) == ['gamma delta']
+
+
+def test_added_files_extend_the_previous_snapshot(path, monkeypatch):
+    monkeypatch.setattr(vector_index, 'choose_index_type', lambda ntotal: 'hnsw')
+    embedder = WordEmbeddings()
+    index = UserIndex.load(path, embedder)
+    index.add_file('a', 'a.pdf', chunks('apples grow on trees', 'pears are green'))
+    index.save()
+
+    builds = []
+    build = UserIndex._build_search_index
+    monkeypatch.setattr(UserIndex, '_build_search_index', lambda self, *args: builds.append(args) or build(self, *args))
+
+    index = UserIndex.load(path, embedder)
+    index.add_file('b', 'b.pdf', chunks('rockets reach orbit'))
+    index.save()
+    assert builds == []
+    loaded = UserIndex.load(path, embedder, for_search=True)
+    assert loaded.manifest['snapshot']['ntotal'] == 3 and loaded.search_store().index.ntotal == 3
+    assert search(loaded, 'rockets reach orbit', k=1) == ['rockets reach orbit']
+    assert search(loaded, 'pears are green', k=1) == ['pears are green']
+
+    # Removing a file shifts positions, so the next snapshot is rebuilt
+    index = UserIndex.load(path, embedder)
+    index.remove_file('a')
+    index.add_file('c', 'c.pdf', chunks('satellites circle earth'))
+    index.save()
+    assert len(builds) == 1
+    loaded = UserIndex.load(path, embedder, for_search=True)
+    assert search(loaded, 'satellites circle earth', k=1) == ['satellites circle earth']
+    assert set(search(loaded, 'pears are green', k=4)) == {'rockets reach orbit', 'satellites circle earth'}
+
+
+def test_old_snapshots_and_segments_are_pruned(path):
+    embedder = WordEmbeddings()
+    index = UserIndex.load(path, embedder)
+    for n in range(5):
+        index.add_file('a', 'a.pdf', chunks(f'revision {n}'))
+        index.save()
+
+    snapshots = os.listdir(os.path.join(path, SNAPSHOT_FOLDER))
+    assert len(snapshots) == 2 and index.manifest['snapshot']['name'] in snapshots
+    assert len(os.listdir(os.path.join(path, FILES_FOLDER))) == 2
+    assert search(UserIndex.load(path, embedder, for_search=True), 'revision', k=4) == ['revision 4']
@@ -0,0 +1,315 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+
+from werkzeug.exceptions import ClientDisconnected
+
+# Configuration
+UPLOAD_MAX_FILE_SIZE = int(os.environ.get('UPLOAD_MAX_FILE_SIZE', 512 * 1024 * 1024))
+UPLOAD_PART_SIZE = int(os.environ.get('UPLOAD_PART_SIZE', 8 * 1024 * 1024))  # Suggested to clients
+UPLOAD_MAX_PAGES = int(os.environ.get('UPLOAD_MAX_PAGES', 0))  # 0 disables the limit
+UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL', 24 * 3600))  # Unfinished uploads are dropped after, seconds
+UPLOAD_AUTO_PROCESS = os.environ.get('UPLOAD_AUTO_PROCESS', 'false').lower() == 'true'
+
+BLOCK_SIZE = 1024 * 1024
+EXPIRE_INTERVAL = 60  # Seconds between sweeps for expired uploads
+PDF_HEADER = b'%PDF-'
+EOF_WINDOW = 1024  # PDF readers accept the %%EOF marker anywhere in the last 1 KB
+
+_PAGE_OBJECT = re.compile(rb'/Type\s{0,8}/Page(?![A-Za-z])')
+_PAGE_COUNT = re.compile(rb'/Count\s{0,8}(\d{1,7})')
+_OVERLAP = 64  # Longer than any match, so markers split across blocks are still found
+
+
+class UploadError(Exception):
+    """An upload request that cannot be served; status is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class UploadOffsetMismatch(UploadError):
+    """A part was sent for the wrong position; offset is where the upload should resume"""
+
+    def __init__(self, offset):
+        super().__init__(f'Upload is at offset {offset}', 409)
+        self.offset = offset
+
+
+class PdfSniffer:
+    """Checks the PDF header and estimates the page count from bytes as they stream past.
+
+    Files must start with %PDF-, so a non-PDF is rejected by its first few bytes.
+
+    Pages are counted from uncompressed /Type /Page objects and the largest /Count of
+    a page tree node. PDFs that keep their objects in compressed object streams show
+    neither, so pages is None for them until they are parsed.
+    """
+
+    def __init__(self):
+        self.head = b''
+        self.page_objects = 0
+        self.max_count = 0
+        self._tail = b''
+
+    def feed(self, block):
+        if len(self.head) < len(PDF_HEADER):
+            self.head += block[:len(PDF_HEADER) - len(self.head)]
+        buffer = self._tail + block
+        for match in _PAGE_OBJECT.finditer(buffer):
+            # Matches ending inside the carried-over tail were counted with the previous block;
+            # one ending exactly at the end is counted with the next, once its following byte is known
+            if len(self._tail) <= match.end() < len(buffer):
+                self.page_objects += 1
+        for match in _PAGE_COUNT.finditer(buffer):
+            self.max_count = max(self.max_count, int(match.group(1)))
+        self._tail = buffer[-_OVERLAP:]
+
+    def finish(self):
+        """Count a page marker at the very end of the file; safe to call more than once"""
+        if any(match.end() == len(self._tail) for match in _PAGE_OBJECT.finditer(self._tail)):
+            self.page_objects += 1
+        self._tail = b''
+
+    @property
+    def is_pdf(self):
+        """True or False as soon as the bytes seen decide it, None before"""
+        if not PDF_HEADER.startswith(self.head):
+            return False
+        return True if self.head == PDF_HEADER else None
+
+    @property
+    def pages(self):
+        return max(self.page_objects, self.max_count) or None
+
+
+def _read_blocks(stream):
+    """Blocks of stream until it ends or the client disconnects"""
+    while True:
+        try:
+            block = stream.read(BLOCK_SIZE)
+        except (ClientDisconnected, OSError):
+            return
+        if not block:
+            return
+        yield block
+
+
+class _Progress:
+    """Hash and sniffer state of an upload, matching its first offset bytes"""
+
+    def __init__(self):
+        self.digest = hashlib.sha256()
+        self.sniffer = PdfSniffer()
+        self.offset = 0
+
+    def update(self, block):
+        self.digest.update(block)
+        self.sniffer.feed(block)
+        self.offset += len(block)
+
+
+class UploadSessions:
+    """Resumable chunked uploads, written straight to disk.
+
+    Each upload is a directory under root holding its metadata and the bytes received
+    so far, so an interrupted upload can continue from its current offset (see
+    status()), also after a restart or from another worker. Parts are hashed and
+    sniffed as they are written; that state is kept in memory and rebuilt from the
+    file when this process has not seen the earlier parts. It is dropped when an
+    append fails, and for uploads finished or removed elsewhere by the periodic
+    expire() sweep.
+    """
+
+    def __init__(self, root, max_file_size=UPLOAD_MAX_FILE_SIZE, max_pages=UPLOAD_MAX_PAGES, ttl=UPLOAD_SESSION_TTL):
+        self.root = root
+        self.max_file_size = max_file_size
+        self.max_pages = max_pages
+        self.ttl = ttl
+        self._progress = {}  # {upload_id: _Progress}
+        self._locks = {}  # {upload_id: Lock}, one append at a time per upload
+        self._lock = threading.Lock()
+        self._expired_at = 0.0
+        os.makedirs(root, exist_ok=True)
+
+    def _folder(self, upload_id):
+        if not re.fullmatch(r'[0-9a-f-]{36}', upload_id or ''):
+            raise UploadError('Upload not found', 404)
+        return os.path.join(self.root, upload_id)
+
+    def _data_path(self, upload_id):
+        return os.path.join(self._folder(upload_id), 'data')
+
+    def _upload_lock(self, upload_id):
+        with self._lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def create(self, user_id, filename, size):
+        """Start an upload of size bytes; returns its status"""
+        if size <= 0:
+            raise UploadError('File is empty')
+        if size > self.max_file_size:
+            raise UploadError(f'File is larger than {self.max_file_size // (1024 * 1024)} MB', 413)
+        self._expire_due()
+
+        upload_id = str(uuid.uuid4())
+        folder = self._folder(upload_id)
+        os.makedirs(folder)
+        open(os.path.join(folder, 'data'), 'wb').close()
+        with open(os.path.join(folder, 'meta.json'), 'w') as f:
+            json.dump({'user_id': user_id, 'filename': filename, 'size': size, 'created_at': time.time()}, f)
+        return self.status(user_id, upload_id)
+
+    def meta(self, user_id, upload_id):
+        try:
+            with open(os.path.join(self._folder(upload_id), 'meta.json')) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise UploadError('Upload not found', 404)
+        if meta['user_id'] != user_id:
+            raise UploadError('Upload not found', 404)
+        return meta
+
+    def status(self, user_id, upload_id):
+        self._expire_due()
+        meta = self.meta(user_id, upload_id)
+        return {
+            'upload_id': upload_id,
+            'filename': meta['filename'],
+            'size': meta['size'],
+            'offset': os.path.getsize(self._data_path(upload_id)),
+            'part_size': UPLOAD_PART_SIZE
+        }
+
+    def append(self, user_id, upload_id, offset, stream):
+        """Write a part read from stream at offset; returns the new status.
+
+        Whatever arrived before a dropped connection is kept, and the client resumes
+        from the offset status() reports.
+        """
+        self._expire_due()
+        meta = self.meta(user_id, upload_id)
+        path = self._data_path(upload_id)
+        with self._upload_lock(upload_id):
+            current = os.path.getsize(path)
+            if offset != current:
+                raise UploadOffsetMismatch(current)
+            progress = self._sync_progress(upload_id, path, current)
+
+            try:
+                with open(path, 'ab') as f:
+                    for block in _read_blocks(stream):
+                        if progress.offset + len(block) > meta['size']:
+                            raise UploadError('Part runs past the declared file size', 413)
+                        f.write(block)
+                        progress.update(block)
+                        self._check(progress)
+            except UploadError as e:
+                if e.status != 413:
+                    self.abort(user_id, upload_id)
+                else:
+                    self._forget_progress(upload_id)
+                raise
+            except Exception:
+                # The hash may be out of step with the file; the next part rebuilds it
+                self._forget_progress(upload_id)
+                raise
+
+            if progress.offset == meta['size']:
+                progress.sniffer.finish()
+                self._check(progress)
+        return {**self.status(user_id, upload_id), 'pages': progress.sniffer.pages}
+
+    def _sync_progress(self, upload_id, path, offset):
+        """Progress for the first offset bytes, re-reading them if this process missed some.
+
+        Called with the upload's lock held; the shared dict is only touched under self._lock.
+        """
+        with self._lock:
+            progress = self._progress.get(upload_id)
+        if progress is None or progress.offset != offset:
+            progress = _Progress()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+                    progress.update(block)
+            with self._lock:
+                self._progress[upload_id] = progress
+        return progress
+
+    def _forget_progress(self, upload_id):
+        with self._lock:
+            self._progress.pop(upload_id, None)
+
+    def _check(self, progress):
+        sniffer = progress.sniffer
+        if sniffer.is_pdf is False:
+            raise UploadError('File is not a PDF')
+        if self.max_pages and sniffer.pages and sniffer.pages > self.max_pages:
+            raise UploadError(f'PDF has more than {self.max_pages} pages')
+
+    def complete(self, user_id, upload_id, sha256=None):
+        """Check a fully received upload; returns (data_path, sha256, size, pages).
+
+        The caller takes ownership of the data file and then calls discard().
+        """
+        meta = self.meta(user_id, upload_id)
+        path = self._data_path(upload_id)
+        with self._upload_lock(upload_id):
+            size = os.path.getsize(path)
+            if size != meta['size']:
+                raise UploadOffsetMismatch(size)
+            progress = self._sync_progress(upload_id, path, size)
+            progress.sniffer.finish()
+            if progress.sniffer.is_pdf is not True:
+                raise UploadError('File is not a PDF')
+            with open(path, 'rb') as f:
+                f.seek(max(0, size - EOF_WINDOW))
+                if b'%%EOF' not in f.read():
+                    raise UploadError('PDF is truncated or damaged')
+            digest = progress.digest.hexdigest()
+            if sha256 and sha256.lower() != digest:
+                raise UploadError('Checksum does not match the uploaded bytes')
+        return path, digest, size, progress.sniffer.pages
+
+    def discard(self, upload_id):
+        with self._lock:
+            self._progress.pop(upload_id, None)
+            self._locks.pop(upload_id, None)
+        shutil.rmtree(self._folder(upload_id), ignore_errors=True)
+
+    def abort(self, user_id, upload_id):
+        self.meta(user_id, upload_id)
+        self.discard(upload_id)
+
+    def _expire_due(self):
+        with self._lock:
+            if time.monotonic() - self._expired_at < EXPIRE_INTERVAL:
+                return
+            self._expired_at = time.monotonic()
+        self.expire()
+
+    def expire(self):
+        """Remove uploads that were started more than ttl seconds ago.
+
+        Also forgets the in-memory state of uploads that no longer exist, e.g. ones
+        completed or aborted through another worker.
+        """
+        cutoff = time.time() - self.ttl
+        for upload_id in os.listdir(self.root):
+            meta_path = os.path.join(self.root, upload_id, 'meta.json')
+            try:
+                if os.path.getmtime(meta_path) < cutoff:
+                    self.discard(upload_id)
+            except (OSError, UploadError):
+                continue
+        with self._lock:
+            for upload_id in list(self._progress.keys() | self._locks.keys()):
+                if not os.path.isdir(os.path.join(self.root, upload_id)):
+                    self._progress.pop(upload_id, None)
+                    self._locks.pop(upload_id, None)
@@ -0,0 +1,635 @@
+import os
+import copy
+import json
+import math
+import mmap
+import uuid
+import fcntl
+import shutil
+import bisect
+from contextlib import contextmanager
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from lexical_index import LexicalIndex
+from retrieval import HybridRetriever
+
+# Search index: 'auto' picks one by corpus size, or one of INDEX_TYPES
+FAISS_INDEX_TYPE = os.environ.get('FAISS_INDEX_TYPE', 'auto')
+FAISS_FLAT_MAX_VECTORS = int(os.environ.get('FAISS_FLAT_MAX_VECTORS', 10000))
+FAISS_IVF_FLAT_MAX_VECTORS = int(os.environ.get('FAISS_IVF_FLAT_MAX_VECTORS', 100000))
+FAISS_SQ_MAX_VECTORS = int(os.environ.get('FAISS_SQ_MAX_VECTORS', 1000000))
+FAISS_TRAIN_SAMPLE = int(os.environ.get('FAISS_TRAIN_SAMPLE', 50000))
+FAISS_NPROBE = int(os.environ.get('FAISS_NPROBE', 16))
+FAISS_HNSW_M = int(os.environ.get('FAISS_HNSW_M', 32))
+FAISS_EF_CONSTRUCTION = int(os.environ.get('FAISS_EF_CONSTRUCTION', 80))
+FAISS_EF_SEARCH = int(os.environ.get('FAISS_EF_SEARCH', 64))
+FAISS_PQ_M = int(os.environ.get('FAISS_PQ_M', 0))  # Sub-quantizers; 0 picks one from the dimension
+# Saves add new vectors to the previous IVF index until the corpus calls for this many times its lists
+FAISS_RETRAIN_RATIO = float(os.environ.get('FAISS_RETRAIN_RATIO', 2.0))
+
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_sq', 'ivf_pq', 'hnsw')
+# Fewest vectors each type can be trained on; smaller corpora stay flat
+_MIN_VECTORS = {'flat': 0, 'hnsw': 0, 'ivf_flat': 39, 'ivf_sq': 39, 'ivf_pq': 39 * 256}
+
+MANIFEST_NAME = 'manifest.json'
+LOCK_NAME = '.lock'
+SNAPSHOT_FOLDER = 'snapshots'
+FILES_FOLDER = 'files'
+LEXICAL_FOLDER = 'lexical'
+
+
+def choose_index_type(ntotal, index_type=FAISS_INDEX_TYPE):
+    """Index type to search ntotal vectors with"""
+    if index_type == 'auto':
+        if ntotal <= FAISS_FLAT_MAX_VECTORS:
+            index_type = 'flat'
+        elif ntotal <= FAISS_IVF_FLAT_MAX_VECTORS:
+            index_type = 'ivf_flat'
+        elif ntotal <= FAISS_SQ_MAX_VECTORS:
+            index_type = 'ivf_sq'
+        else:
+            index_type = 'ivf_pq'
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type: {index_type}")
+    return index_type if ntotal >= _MIN_VECTORS[index_type] else 'flat'
+
+
+def _pq_subquantizers(d):
+    # Largest divisor of d up to d / 4, so each sub-quantizer covers at least 4 dimensions
+    for m in range(max(1, d // 4), 0, -1):
+        if d % m == 0:
+            return m
+    return 1
+
+
+def ivf_nlist(n):
+    """Number of IVF lists for n vectors: about 4 * sqrt(n), with at least 39 training vectors per list"""
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def build_search_index(vectors, index_type, metric=faiss.METRIC_L2, nprobe=FAISS_NPROBE,
+                       ef_search=FAISS_EF_SEARCH, train_sample=FAISS_TRAIN_SAMPLE):
+    """Build a FAISS index of index_type over vectors, keeping their order as ids.
+
+    IVF indexes get about 4 * sqrt(n) lists and are trained on a random sample of at
+    most train_sample vectors (never fewer than 39 per list). nprobe and ef_search are
+    the defaults used when a query does not set its own.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    n, d = vectors.shape
+    if index_type == 'flat':
+        index = faiss.IndexFlat(d, metric)
+    elif index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(d, FAISS_HNSW_M, metric)
+        index.hnsw.efConstruction = FAISS_EF_CONSTRUCTION
+        index.hnsw.efSearch = ef_search
+    else:
+        nlist = ivf_nlist(n)
+        quantizer = faiss.IndexFlat(d, metric)
+        if index_type == 'ivf_flat':
+            index = faiss.IndexIVFFlat(quantizer, d, nlist, metric)
+        elif index_type == 'ivf_sq':
+            index = faiss.IndexIVFScalarQuantizer(quantizer, d, nlist, faiss.ScalarQuantizer.QT_8bit, metric)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, FAISS_PQ_M or _pq_subquantizers(d), 8, metric)
+        sample_size = min(n, max(train_sample, nlist * 39))
+        sample = vectors if sample_size == n else vectors[np.random.default_rng(0).choice(n, sample_size, replace=False)]
+        index.train(sample)
+        index.nprobe = min(nprobe, nlist)
+    index.add(vectors)
+    return index
+
+
+def search_parameters(index, nprobe=None, ef_search=None, selector=None, selected=None):
+    """Per-query FAISS search parameters for index, or None to use its defaults.
+
+    selector restricts the search to the ids it accepts (selected of them). IVF
+    indexes then probe proportionally more lists, so a search scoped to a small part
+    of the corpus still sees about as many candidates as an unscoped one.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and (nprobe is not None or selector is not None):
+        nprobe = nprobe or ivf.nprobe
+        if selector is not None and selected:
+            nprobe = min(ivf.nlist, math.ceil(nprobe * index.ntotal / selected))
+        params = faiss.SearchParametersIVF(nprobe=int(nprobe))
+    elif isinstance(index, faiss.IndexHNSW) and (ef_search is not None or selector is not None):
+        params = faiss.SearchParametersHNSW(efSearch=int(ef_search or index.hnsw.efSearch))
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+    if selector is not None:
+        params.sel = selector
+    return params
+
+
+def range_selector(ranges):
+    """FAISS selector accepting the ids of several (start, count) ranges; returns it and the number of ids"""
+    selectors = [faiss.IDSelectorRange(start, start + count) for start, count in ranges]
+    selector = selectors[0]
+    for other in selectors[1:]:
+        selector = faiss.IDSelectorOr(selector, other)
+    # The combined selector only points at its parts; keep them alive with it
+    selector.parts = selectors
+    return selector, sum(count for _, count in ranges)
+
+
+def chunk_ranges(chunk_ids):
+    """{file_id: (first position, chunk count)} from the chunk ids in position order"""
+    ranges = {}
+    for position, chunk_id in enumerate(chunk_ids):
+        file_id, n = chunk_id.rsplit(':', 1)
+        start, count = ranges.get(file_id, (position, 0))
+        if position != start + count or int(n) != count:
+            raise ValueError(f"Chunks of file {file_id} are not stored contiguously")
+        ranges[file_id] = (start, count + 1)
+    return ranges
+
+
+class _ParameterizedIndex:
+    """Index view whose search() applies fixed search parameters"""
+
+    def __init__(self, index, params):
+        self._index = index
+        self._params = params
+
+    def search(self, x, k):
+        return self._index.search(x, k, params=self._params)
+
+    def __getattr__(self, name):
+        return getattr(self._index, name)
+
+
+class TunableFAISS(FAISS):
+    """FAISS store that accepts nprobe / ef_search as search kwargs.
+
+    The parameters apply to a single query, so concurrent searches with different
+    settings never change the shared index.
+    """
+
+    _file_ranges = None  # Known up front for snapshots; derived from the ids otherwise
+
+    @property
+    def file_ranges(self):
+        """{file_id: (first position, chunk count)}; a file's chunks occupy consecutive positions"""
+        if self._file_ranges is not None:
+            return self._file_ranges
+        return chunk_ranges(self.index_to_docstore_id[position] for position in range(self.index.ntotal))
+
+    def document(self, position):
+        return self.docstore.search(self.index_to_docstore_id[position])
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, fetch_k=20, **kwargs):
+        params = search_parameters(self.index, kwargs.pop('nprobe', None), kwargs.pop('ef_search', None))
+        store = self
+        if params is not None:
+            store = copy.copy(self)
+            store.index = _ParameterizedIndex(self.index, params)
+        return FAISS.similarity_search_with_score_by_vector(store, embedding, k, filter, fetch_k, **kwargs)
+
+    def search_positions(self, embeddings, k=4, file_ids=None, nprobe=None, ef_search=None):
+        """Distances and positions of the top-k vectors for each query vector, in one FAISS search call.
+
+        With file_ids only the chunks of those files are searched. Missing results
+        are -1, as in FAISS.
+        """
+        vectors = np.array(embeddings, dtype=np.float32)
+        if self._normalize_L2:
+            faiss.normalize_L2(vectors)
+        selector, selected = None, None
+        if file_ids is not None:
+            ranges = [self.file_ranges[file_id] for file_id in sorted(file_ids) if file_id in self.file_ranges]
+            if not ranges:
+                return np.full((len(vectors), k), np.inf, dtype=np.float32), np.full((len(vectors), k), -1)
+            selector, selected = range_selector(ranges)
+        params = search_parameters(self.index, nprobe, ef_search, selector, selected)
+        if params is None:
+            return self.index.search(vectors, k)
+        return self.index.search(vectors, k, params=params)
+
+    def similarity_search_batch_by_vector(self, embeddings, k=4, nprobe=None, ef_search=None):
+        """Top-k documents for each of several query vectors, found with one FAISS search call"""
+        _, indices = self.search_positions(embeddings, k, nprobe=nprobe, ef_search=ef_search)
+        return [[self.document(i) for i in row if i != -1] for row in indices]
+
+
+class MappedChunks:
+    """Chunks of one file, read on demand from a memory-mapped file.
+
+    chunks.jsonl holds one JSON record per chunk and chunks.offsets.npy the byte
+    offset of each record (plus the end of the last), so a lookup touches only the
+    pages of the chunks it returns.
+    """
+
+    def __init__(self, folder):
+        self._offsets = np.load(os.path.join(folder, 'chunks.offsets.npy'), mmap_mode='r')
+        with open(os.path.join(folder, 'chunks.jsonl'), 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @property
+    def nbytes(self):
+        return len(self._data)
+
+    def search(self, n):
+        start, end = self._offsets[n], self._offsets[n + 1]
+        record = json.loads(self._data[start:end])
+        return Document(id=record['id'], page_content=record['page_content'], metadata=record['metadata'])
+
+
+class MappedDocstore:
+    """Chunks of a snapshot by vector position, spread over the files' MappedChunks"""
+
+    def __init__(self, parts):
+        parts = sorted(parts, key=lambda part: part[0])  # [(first position, MappedChunks)]
+        self._starts = [start for start, _ in parts]
+        self._chunks = [chunks for _, chunks in parts]
+
+    @property
+    def nbytes(self):
+        return sum(chunks.nbytes for chunks in self._chunks)
+
+    def search(self, position):
+        part = bisect.bisect_right(self._starts, position) - 1
+        return self._chunks[part].search(position - self._starts[part])
+
+
+class _Positions:
+    """index_to_docstore_id for a MappedDocstore: vector positions are the ids"""
+
+    def __init__(self, n):
+        self._n = n
+
+    def __getitem__(self, position):
+        return int(position)
+
+    def __len__(self):
+        return self._n
+
+
+def write_file_segment(folder, chunk_ids, documents, vectors):
+    """Write one file's vectors and chunks; segments are never modified afterwards"""
+    tmp_folder = os.path.join(os.path.dirname(folder), '.tmp-' + os.path.basename(folder))
+    os.makedirs(tmp_folder)
+    np.save(os.path.join(tmp_folder, 'vectors.npy'), vectors)
+    offsets = np.zeros(len(documents) + 1, dtype=np.uint64)
+    with open(os.path.join(tmp_folder, 'chunks.jsonl'), 'wb') as f:
+        for n, (chunk_id, doc) in enumerate(zip(chunk_ids, documents)):
+            f.write(json.dumps({'id': chunk_id, 'page_content': doc.page_content, 'metadata': doc.metadata}).encode('utf-8'))
+            f.write(b'\n')
+            offsets[n + 1] = f.tell()
+    np.save(os.path.join(tmp_folder, 'chunks.offsets.npy'), offsets)
+    os.replace(tmp_folder, folder)
+
+
+def read_snapshot_files(folder):
+    """{file_id: (first position, chunk count, segment name)} of a snapshot, or None if it predates files.json.
+
+    Segment names are None in snapshots that kept their own copy of the chunks.
+    """
+    try:
+        with open(os.path.join(folder, 'files.json')) as f:
+            return {file_id: (r[0], r[1], r[2] if len(r) > 2 else None) for file_id, r in json.load(f).items()}
+    except FileNotFoundError:
+        return None
+
+
+def open_snapshot(folder, index_type, embedder, files_root):
+    """Open a snapshot read-only with its vectors and chunks memory-mapped"""
+    # IVF lists and flat codes are mapped by different FAISS readers; faiss before 1.9 cannot map
+    # flat codes, so those indexes are read into memory there
+    flags = faiss.IO_FLAG_MMAP if index_type.startswith('ivf') else getattr(faiss, 'IO_FLAG_MMAP_IFC', 0)
+    index = faiss.read_index(os.path.join(folder, 'vectors.faiss'), flags | faiss.IO_FLAG_READ_ONLY)
+    files = read_snapshot_files(folder)
+    if os.path.exists(os.path.join(folder, 'chunks.jsonl')):
+        # Snapshot written before chunks were stored per file
+        docstore = MappedDocstore([(0, MappedChunks(folder))])
+    else:
+        docstore = MappedDocstore([(start, MappedChunks(os.path.join(files_root, segment)))
+                                   for start, count, segment in files.values() if count])
+    store = TunableFAISS(embedder, index, docstore, _Positions(index.ntotal))
+    if files is not None:
+        store._file_ranges = {file_id: (start, count) for file_id, (start, count, _) in files.items()}
+    else:
+        store._file_ranges = chunk_ranges(docstore.search(position).id for position in range(index.ntotal))
+    return store
+
+
+class UserIndex:
+    """A user's FAISS index together with a manifest of the files it contains.
+
+    Chunks are stored under stable ids (``<file_id>:<n>``) so a single file can be
+    added or removed without re-embedding the rest of the corpus. Each file's
+    vectors and chunks are written once, to their own segment under files/. Each
+    save() writes a read-only snapshot for retrieval. It holds the search index,
+    of a type chosen by corpus size (see choose_index_type), and refers to the
+    file segments for chunks. Snapshots are memory-mapped so that all worker
+    processes share their pages through the OS page cache. When files were only
+    added, the previous snapshot's index is extended instead of rebuilt. A BM25
+    index of the same chunks is kept alongside, one segment per file (see
+    LexicalIndex).
+    """
+
+    def __init__(self, path, embedder, manifest=None, search_store=None, legacy_store=None):
+        self.path = path
+        self.embedder = embedder
+        self.manifest = manifest or {'version': 0, 'files': {}}
+        self._search_store = search_store
+        self._added = {}  # {file_id: (documents, vectors)} not yet written
+        self._removed = False  # Whether positions shifted since the last save
+        self._legacy_store = legacy_store  # Whole-corpus store saved before per-file segments
+        self.lexical = LexicalIndex(os.path.join(path, LEXICAL_FOLDER))
+
+    @classmethod
+    def load(cls, path, embedder, for_search=False):
+        """Load the index stored at path, or return an empty one.
+
+        With for_search only the current snapshot is opened; such an index can be
+        searched but not updated.
+        """
+        manifest = cls.read_manifest(path)
+
+        snapshot = manifest and manifest.get('snapshot')
+        if for_search and snapshot:
+            search_store = open_snapshot(os.path.join(path, SNAPSHOT_FOLDER, snapshot['name']), snapshot['type'],
+                                         embedder, os.path.join(path, FILES_FOLDER))
+            return cls(path, embedder, manifest, search_store)
+
+        # Without a manifest nothing was saved, or the index predates manifests and is rebuilt on next process
+        legacy_store = None
+        if manifest is not None and os.path.exists(os.path.join(path, 'index.faiss')):
+            # Saved before per-file segments; migrated by the next save
+            legacy_store = TunableFAISS.load_local(path, embedder, allow_dangerous_deserialization=True)
+
+        return cls(path, embedder, manifest, legacy_store=legacy_store)
+
+    @staticmethod
+    @contextmanager
+    def lock(path):
+        """Hold the update lock of the index at path, shared by all worker processes.
+
+        Load, change and save() an index under it, so concurrent updates of one
+        user's index run one after another, each starting from the last saved state.
+        """
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, LOCK_NAME), 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def read_manifest(path):
+        manifest_path = os.path.join(path, MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path) as f:
+            return json.load(f)
+
+    @staticmethod
+    def disk_version(path):
+        """Cheap token that changes whenever a new index is saved at path"""
+        try:
+            return os.stat(os.path.join(path, MANIFEST_NAME)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def exists(path):
+        """Whether a non-empty index has been saved at path"""
+        manifest = UserIndex.read_manifest(path)
+        return bool(manifest and (manifest.get('snapshot') or os.path.exists(os.path.join(path, 'index.faiss'))))
+
+    @property
+    def version(self):
+        return self.manifest['version']
+
+    @property
+    def file_ids(self):
+        return set(self.manifest['files'])
+
+    @property
+    def is_empty(self):
+        return not any(entry['chunk_ids'] for entry in self.manifest['files'].values())
+
+    def add_file(self, file_id, name, documents, vectors=None):
+        """Add the chunks of one file, embedding them unless their vectors are given"""
+        if file_id in self.manifest['files']:
+            self.remove_file(file_id)
+
+        ids = [f"{file_id}:{i}" for i in range(len(documents))]
+        if documents and vectors is None:
+            vectors = self.embedder.embed_documents([doc.page_content for doc in documents])
+        vectors = np.asarray(vectors, dtype=np.float32) if documents else np.zeros((0, 0), dtype=np.float32)
+        self._added[file_id] = (documents, vectors)
+
+        self.lexical.add(file_id, [doc.page_content for doc in documents])
+        self.manifest['files'][file_id] = {'name': name, 'chunk_ids': ids}
+        self.manifest['version'] += 1
+        return ids
+
+    def remove_file(self, file_id):
+        """Remove the chunks of one file; returns False if it was not indexed"""
+        entry = self.manifest['files'].pop(file_id, None)
+        if entry is None:
+            return False
+
+        self._added.pop(file_id, None)
+        self.lexical.remove(file_id)
+        self._removed = True
+        self.manifest['version'] += 1
+        return True
+
+    def save(self):
+        """Persist new file segments, lexical segments, a retrieval snapshot and the manifest.
+
+        Call it while holding lock(). Segments and snapshots are written under new
+        names and never overwritten, since other workers may have them mapped.
+        """
+        files_root = os.path.join(self.path, FILES_FOLDER)
+        snapshot_root = os.path.join(self.path, SNAPSHOT_FOLDER)
+        os.makedirs(files_root, exist_ok=True)
+        self._migrate_legacy()
+        for file_id, (documents, vectors) in self._added.items():
+            entry = self.manifest['files'][file_id]
+            segment = f"{file_id}-{uuid.uuid4().hex[:8]}"
+            write_file_segment(os.path.join(files_root, segment), entry['chunk_ids'], documents, vectors)
+            entry['segment'] = segment
+        self._backfill_lexical()
+        self.lexical.save()
+
+        previous = self.manifest.pop('snapshot', None)
+        self._search_store = None
+        if not self.is_empty:
+            files, position = {}, 0
+            for file_id, entry in self.manifest['files'].items():
+                files[file_id] = (position, len(entry['chunk_ids']), entry['segment'])
+                position += len(entry['chunk_ids'])
+            index_type = choose_index_type(position)
+            search_index = self._extend_snapshot(previous, files, index_type)
+            if search_index is None:
+                search_index = self._build_search_index(files, index_type)
+
+            name = f"{self.version}-{uuid.uuid4().hex[:8]}"
+            folder = os.path.join(snapshot_root, name)
+            tmp_folder = os.path.join(snapshot_root, '.tmp-' + name)
+            os.makedirs(tmp_folder)
+            faiss.write_index(search_index, os.path.join(tmp_folder, 'vectors.faiss'))
+            with open(os.path.join(tmp_folder, 'files.json'), 'w') as f:
+                json.dump(files, f)
+            os.replace(tmp_folder, folder)
+            self.manifest['snapshot'] = {'name': name, 'type': index_type, 'ntotal': position}
+            self._search_store = open_snapshot(folder, index_type, self.embedder, files_root)
+
+        # Write the manifest last so a crash mid-save never advertises missing chunks
+        tmp_path = os.path.join(self.path, MANIFEST_NAME + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, os.path.join(self.path, MANIFEST_NAME))
+
+        self._added.clear()
+        self._removed = False
+        if self._legacy_store is not None:
+            self._legacy_store = None
+            for name in ('index.faiss', 'index.pkl'):
+                if os.path.exists(os.path.join(self.path, name)):
+                    os.remove(os.path.join(self.path, name))
+        self._prune_snapshots(snapshot_root)
+        self._prune_segments(files_root, snapshot_root)
+
+    def _migrate_legacy(self):
+        """Queue segments for files that so far only exist in the whole-corpus legacy store"""
+        if self._legacy_store is None:
+            return
+        ranges = self._legacy_store.file_ranges
+        for file_id, entry in self.manifest['files'].items():
+            if entry.get('segment') is None and file_id not in self._added:
+                start, count = ranges.get(file_id, (0, 0))
+                documents = [self._legacy_store.document(position) for position in range(start, start + count)]
+                vectors = (self._legacy_store.index.reconstruct_n(start, count) if count
+                           else np.zeros((0, 0), dtype=np.float32))
+                self._added[file_id] = (documents, vectors)
+
+    def _file_vectors(self, file_id):
+        if file_id in self._added:
+            return self._added[file_id][1]
+        segment = self.manifest['files'][file_id]['segment']
+        return np.load(os.path.join(self.path, FILES_FOLDER, segment, 'vectors.npy'), mmap_mode='r')
+
+    def _extend_snapshot(self, previous, files, index_type):
+        """The previous snapshot's search index with the vectors of new files added, or None to rebuild.
+
+        This works while files were only appended: removals shift positions, and IVF
+        is retrained once the corpus calls for FAISS_RETRAIN_RATIO times its lists.
+        Flat indexes are cheap to rebuild and always are.
+        """
+        if self._removed or previous is None or previous['type'] != index_type or index_type == 'flat':
+            return None
+        folder = os.path.join(self.path, SNAPSHOT_FOLDER, previous['name'])
+        previous_files = read_snapshot_files(folder)
+        if previous_files is None or any(files.get(file_id, (None,))[:2] != (start, count)
+                                         for file_id, (start, count, _) in previous_files.items()):
+            return None
+
+        index = faiss.read_index(os.path.join(folder, 'vectors.faiss'))
+        ivf = faiss.try_extract_index_ivf(index)
+        ntotal = sum(count for _, count, _ in files.values())
+        if index.ntotal != previous['ntotal'] or (ivf is not None and ivf_nlist(ntotal) > FAISS_RETRAIN_RATIO * ivf.nlist):
+            return None
+        new_files = sorted((start, file_id) for file_id, (start, count, _) in files.items()
+                           if file_id not in previous_files and count)
+        if new_files:
+            index.add(np.concatenate([self._file_vectors(file_id) for _, file_id in new_files]))
+        return index
+
+    def _build_search_index(self, files, index_type):
+        vectors = np.concatenate([self._file_vectors(file_id) for file_id, (_, count, _) in files.items() if count])
+        if index_type == 'flat':
+            index = faiss.IndexFlat(vectors.shape[1], faiss.METRIC_L2)
+            index.add(vectors)
+            return index
+        return build_search_index(vectors, index_type, faiss.METRIC_L2)
+
+    def _backfill_lexical(self):
+        """Build lexical segments for files indexed before the lexical index existed"""
+        for file_id, entry in self.manifest['files'].items():
+            if not self.lexical.has(file_id):
+                if file_id in self._added:
+                    documents = self._added[file_id][0]
+                else:
+                    chunks = MappedChunks(os.path.join(self.path, FILES_FOLDER, entry['segment']))
+                    documents = [chunks.search(n) for n in range(len(entry['chunk_ids']))]
+                self.lexical.add(file_id, [doc.page_content for doc in documents])
+
+    def _prune_snapshots(self, snapshot_root, keep=2):
+        """Delete old snapshots, keeping the newest few for workers still opening them"""
+        if not os.path.isdir(snapshot_root):
+            return
+        entries = os.listdir(snapshot_root)
+        # Snapshots are named <version>-<token> (just <version> before tokens were added)
+        names = sorted((name for name in entries if name.split('-')[0].isdigit()), key=lambda name: int(name.split('-')[0]))
+        current = (self.manifest.get('snapshot') or {}).get('name')
+        stale = names if current is None else [name for name in names[:-keep] if name != current]
+        # Left behind by a save that did not finish; no other save runs under the lock
+        stale += [name for name in entries if name.startswith('.tmp-')]
+        for name in stale:
+            # Workers that already mapped these files keep them until they reload
+            shutil.rmtree(os.path.join(snapshot_root, name), ignore_errors=True)
+
+    def _prune_segments(self, files_root, snapshot_root):
+        """Delete file segments that neither the manifest nor a remaining snapshot refers to"""
+        used = {entry.get('segment') for entry in self.manifest['files'].values()}
+        if os.path.isdir(snapshot_root):
+            for name in os.listdir(snapshot_root):
+                files = read_snapshot_files(os.path.join(snapshot_root, name))
+                used.update(segment for _, _, segment in (files or {}).values())
+        for name in os.listdir(files_root):
+            if name not in used:
+                shutil.rmtree(os.path.join(files_root, name), ignore_errors=True)
+
+    def search_store(self):
+        """The vector store retrieval should use"""
+        snapshot = self.manifest.get('snapshot')
+        if self._search_store is None and snapshot and not self._added and not self._removed:
+            self._search_store = open_snapshot(os.path.join(self.path, SNAPSHOT_FOLDER, snapshot['name']),
+                                               snapshot['type'], self.embedder, os.path.join(self.path, FILES_FOLDER))
+        return self._search_store if self._search_store is not None else self._legacy_store
+
+    def estimate_bytes(self):
+        return estimate_index_bytes(self.search_store()) + self.lexical.nbytes
+
+    def as_retriever(self):
+        # Segments are read on first use; an index being updated only needs the ones it writes
+        self.lexical.load(file_id for file_id in self.manifest['files'] if file_id not in self.lexical.segments)
+        return HybridRetriever(
+            self.search_store(),
+            self.lexical,
+            sources={file_id: entry['name'] for file_id, entry in self.manifest['files'].items()},
+            metadata={"corpus_version": self.version}
+        )
+
+
+def estimate_vector_bytes(index):
+    """Approximate memory held by a FAISS index"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        # Codes plus stored ids, and the coarse centroids
+        return index.ntotal * (ivf.code_size + 8) + ivf.nlist * index.d * 4
+    if isinstance(index, faiss.IndexHNSW):
+        return index.ntotal * (index.d * 4 + index.hnsw.nb_neighbors(0) * 4)
+    return index.ntotal * index.d * 4
+
+
+def estimate_index_bytes(vector_store):
+    """Approximate resident size of a FAISS store: vectors plus chunk texts"""
+    size = estimate_vector_bytes(vector_store.index)
+    if isinstance(vector_store.docstore, MappedDocstore):
+        return size + vector_store.docstore.nbytes
+    for doc in vector_store.docstore._dict.values():
+        size += len(doc.page_content)
+    return size
@@ -0,0 +1,3 @@
+from app import app
+
+# Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
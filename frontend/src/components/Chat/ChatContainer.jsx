@@ -2,7 +2,7 @@ import React from 'react';
 import WelcomeMessage from './WelcomeMessage';
 import MessageList from './MessageList';
 
-function ChatContainer({ messages, isLoading, onDeleteMessage, messagesEndRef }) {
+function ChatContainer({ messages, isLoading, onDeleteMessage, hasMoreHistory, isLoadingHistory, onLoadMoreHistory, messagesEndRef }) {
   return (
     <div className="flex-1 overflow-y-auto bg-slate-900">
       {messages.length === 0 ? (
@@ -12,6 +12,9 @@ function ChatContainer({ messages, isLoading, onDeleteMessage, messagesEndRef })
           messages={messages}
           isLoading={isLoading}
           onDeleteMessage={onDeleteMessage}
+          hasMoreHistory={hasMoreHistory}
+          isLoadingHistory={isLoadingHistory}
+          onLoadMoreHistory={onLoadMoreHistory}
           messagesEndRef={messagesEndRef}
         />
       )}
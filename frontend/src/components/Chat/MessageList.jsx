@@ -1,9 +1,18 @@
 import React from 'react';
 import MessageItem from './MessageItem';
 
-function MessageList({ messages, isLoading, onDeleteMessage, messagesEndRef }) {
+function MessageList({ messages, isLoading, onDeleteMessage, hasMoreHistory, isLoadingHistory, onLoadMoreHistory, messagesEndRef }) {
   return (
     <div className="flex flex-col space-y-6 p-4">
+      {hasMoreHistory && (
+        <button
+          className="self-center px-3 py-1.5 text-sm text-slate-400 hover:text-white hover:bg-slate-800 rounded-lg transition disabled:opacity-50"
+          onClick={onLoadMoreHistory}
+          disabled={isLoadingHistory}
+        >
+          {isLoadingHistory ? 'Loading...' : 'Load earlier messages'}
+        </button>
+      )}
       {messages.map((msg, index) => (
         <MessageItem 
           key={index}
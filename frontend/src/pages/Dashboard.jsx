@@ -15,6 +15,8 @@ function Dashboard() {
   const [isProcessing, setIsProcessing] = useState(false);
   const [isReady, setIsReady] = useState(false);
   const [messages, setMessages] = useState([]);
+  const [historyCursor, setHistoryCursor] = useState(null);
+  const [isLoadingHistory, setIsLoadingHistory] = useState(false);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState(null);
@@ -37,10 +39,11 @@ function Dashboard() {
     fetchHistory();
   }, []);
 
-  // Scroll to bottom of messages
+  // Scroll to bottom when a message is added, not when older ones are loaded
+  const lastMessage = messages[messages.length - 1];
   useEffect(() => {
     scrollToBottom();
-  }, [messages]);
+  }, [lastMessage]);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({
@@ -76,19 +79,42 @@ function Dashboard() {
     }
   };
 
-  // Fetch chat history
+  // Fetch the latest page of chat history (pages come newest first)
   const fetchHistory = async () => {
     try {
       const response = await axios.get(`${API_URL}/history`);
       
       if (response.data.success) {
-        setMessages(response.data.history);
+        setMessages([...response.data.history].reverse());
+        setHistoryCursor(response.data.next_cursor);
       }
     } catch (error) {
       console.error('Error fetching chat history:', error);
     }
   };
 
+  // Prepend the next page of older chat history
+  const loadOlderHistory = async () => {
+    if (!historyCursor || isLoadingHistory) return;
+    try {
+      setIsLoadingHistory(true);
+      const response = await axios.get(`${API_URL}/history`, {
+        params: { before: historyCursor }
+      });
+      
+      if (response.data.success) {
+        const older = [...response.data.history].reverse();
+        setMessages(current => [...older, ...current]);
+        setHistoryCursor(response.data.next_cursor);
+      }
+    } catch (error) {
+      console.error('Error fetching chat history:', error);
+      setError('Failed to load older messages');
+    } finally {
+      setIsLoadingHistory(false);
+    }
+  };
+
   // Handle file upload
   const handleFileUpload = async (event) => {
     const file = event.target.files[0];
@@ -163,12 +189,25 @@ function Dashboard() {
       setIsProcessing(true);
       const response = await axios.post(`${API_URL}/process`);
       
-      if (response.data.success) {
+      if (!response.data.success) {
+        setError(response.data.message);
+        return;
+      }
+
+      // Processing runs in the background; poll until the job finishes
+      let job = response.data.job;
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, 2000));
+        const statusResponse = await axios.get(`${API_URL}/process/status`);
+        job = statusResponse.data.job;
+      }
+
+      if (job.status === 'done') {
         setIsReady(true);
         await fetchUserStatus();
         setError(null);
       } else {
-        setError(response.data.message);
+        setError(job.message);
       }
     } catch (error) {
       console.error('Error processing files:', error);
@@ -250,6 +289,7 @@ function Dashboard() {
       const response = await axios.delete(`${API_URL}/history`);
       if (response.data.success) {
         setMessages([]);
+        setHistoryCursor(null);
       } else {
         setError(response.data.message);
       }
@@ -299,6 +339,9 @@ function Dashboard() {
           messages={messages}
           isLoading={isLoading}
           onDeleteMessage={deleteHistoryItem}
+          hasMoreHistory={Boolean(historyCursor)}
+          isLoadingHistory={isLoadingHistory}
+          onLoadMoreHistory={loadOlderHistory}
           messagesEndRef={messagesEndRef}
         />
         